@@ -0,0 +1,484 @@
+#! /usr/bin/env python3
+
+from __future__ import print_function
+
+import sys
+import os
+import time
+import json
+import argparse
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+from plate_reader import PlateReader, PATH_ALPHA_MODEL, PATH_NUM_MODEL, PATH_PARKING_ID, CAR_WIDTH, CAR_HEIGHT
+from plate_rectifier import PlateRectifier
+from model import Model
+from driver import Driver
+from scrape_frames import DataScraper
+from inference import BACKENDS
+from hsv_view import ImageProcessor
+from char_reader import CharReader
+import inference
+import contour_analysis
+from color_lut import ColorClassifier, CLASSES
+from frame_context import FrameContext
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LP_DATA_PATH = os.path.join(SRC_PATH, 'license-plate-data')
+"""Character datasets (folder, reader), the label being the 7th character of the file name (plate_<char>...)"""
+CHAR_DATASETS = {
+    "char-data": ('char-data', None),
+    "alpha-data-compressed": ('alpha-data-compressed', 'alpha'),
+    "num-data-compressed": ('num-data-compressed', 'num'),
+    "alpha-edge-data": ('alpha-edge-data', 'alpha'),
+    "num-edge-data": ('num-edge-data', 'num')
+}
+LABEL_INDEX = 6
+
+REPS = 50
+BATCH_SIZE = 32
+RESULTS_PATH = os.path.join(tempfile.gettempdir(), 'benchmark_results.json')  # outside the tree, see --out
+
+
+def time_per_call(fn, reps=REPS):
+    """Times a function over a number of repetitions, after one warm up call.
+
+    Args:
+        fn (function): function without arguments to be timed
+        reps (int, optional): number of timed calls. Defaults to REPS.
+
+    Returns:
+        float: mean latency of a single call, in milliseconds
+    """
+    fn()
+    start = time.perf_counter()
+    for i in range(reps):
+        fn()
+    return 1000.0*(time.perf_counter() - start) / reps
+
+
+def load_frames(folder=LP_DATA_PATH):
+    """Loads all the raw frames of a folder.
+
+    Args:
+        folder (str, optional): folder containing the frames. Defaults to LP_DATA_PATH.
+
+    Returns:
+        list[cv::Mat]: the frames, in bgr
+    """
+    file_list = sorted(os.listdir(folder))
+    return [cv2.imread(os.path.join(folder, filename)) for filename in file_list]
+
+
+def load_dataset(folder, limit=None):
+    """Loads the images of a dataset folder, in sorted order.
+
+    Args:
+        folder (str): folder containing the images, relative to SRC_PATH
+        limit (int, optional): max number of images loaded. Defaults to None (all).
+
+    Returns:
+        tuple[list[str], list[cv::Mat]]: the file names and the images, in bgr
+    """
+    file_list = sorted(os.listdir(os.path.join(SRC_PATH, folder)))[:limit]
+    return file_list, [cv2.imread(os.path.join(SRC_PATH, folder, filename)) for filename in file_list]
+
+
+def latency_stats(name, dataset, mode, items, latencies):
+    """Summarizes the latencies of a benchmark.
+
+    Args:
+        name (str): name of the benchmarked function
+        dataset (str): name of the dataset
+        mode (str): "single" or "batched"
+        items (int): number of items processed
+        latencies (list[float]): latency of every call (item or batch) in seconds
+
+    Returns:
+        dict: the benchmark result, with the throughput in items/s and the call latencies in ms
+    """
+    lat_ms = 1000.0*np.array(latencies)
+    total = float(np.sum(latencies))
+    return {
+        "name": name,
+        "dataset": dataset,
+        "mode": mode,
+        "items": items,
+        "calls": len(latencies),
+        "total_secs": total,
+        "items_per_sec": items / total if total > 0 else 0,
+        "latency_ms": {
+            "mean": float(np.mean(lat_ms)),
+            "p50": float(np.percentile(lat_ms, 50)),
+            "p95": float(np.percentile(lat_ms, 95)),
+            "max": float(np.amax(lat_ms))
+        }
+    }
+
+
+def timed_calls(fn, args_list):
+    """Calls a function on each arguments, after one warm up call, timing each call.
+
+    Args:
+        fn (function): function to be timed
+        args_list (list[tuple]): arguments of each call
+
+    Returns:
+        tuple[list[any], list[float]]: the output and the latency in seconds of each call
+    """
+    fn(*args_list[0])
+    outs = []
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        outs.append(fn(*args))
+        latencies.append(time.perf_counter() - start)
+    return outs, latencies
+
+
+def suite_predict_char(pr, limit=None, batch_size=BATCH_SIZE):
+    """Benchmarks CharReader.predict_char (single) and CharReader.predict_chars (batched) over the character datasets.
+    Also reports the accuracy of the batched predictions.
+
+    Args:
+        pr (PlateReader): plate reader with the loaded models
+        limit (int, optional): max number of images per dataset. Defaults to None (all).
+        batch_size (int, optional): number of images per batch. Defaults to BATCH_SIZE.
+
+    Returns:
+        list[dict]: the benchmark results
+    """
+    results = []
+    for dataset, (folder, kind) in CHAR_DATASETS.items():
+        file_list, imgs = load_dataset(folder, limit)
+        labels = [filename[LABEL_INDEX] for filename in file_list]
+        if kind is None:
+            # mixed dataset: letters to the alpha reader, numbers to the num reader
+            groups = {
+                'alpha': [i for i, l in enumerate(labels) if l.isalpha()],
+                'num': [i for i, l in enumerate(labels) if l.isdigit()]
+            }
+        else:
+            groups = {kind: list(range(len(imgs)))}
+        for kind, idxs in groups.items():
+            if not idxs:
+                continue
+            reader = pr.alpha_reader if kind == 'alpha' else pr.num_reader
+            name = "{} ({})".format(dataset, kind) if len(groups) > 1 else dataset
+            group_imgs = [imgs[i] for i in idxs]
+
+            outs, lat = timed_calls(reader.predict_char, [(img,) for img in group_imgs])
+            results.append(latency_stats("CharReader.predict_char", name, "single", len(group_imgs), lat))
+
+            batches = [group_imgs[i:i + batch_size] for i in range(0, len(group_imgs), batch_size)]
+            outs, lat = timed_calls(reader.predict_chars, [(batch,) for batch in batches])
+            res = latency_stats("CharReader.predict_chars", name, "batched", len(group_imgs), lat)
+            preds = [CharReader.interpret(vec) for out in outs for vec in out]
+            res["accuracy"] = float(np.mean([p == labels[i] for p, i in zip(preds, idxs)]))
+            results.append(res)
+    return results
+
+
+def suite_plates(pr, limit=None):
+    """Benchmarks PlateReader.get_plate_view, PlateReader.characters (single and batched) and DataScraper.process_img 
+    over the full frames of the license plate dataset.
+
+    Args:
+        pr (PlateReader): plate reader with the loaded models
+        limit (int, optional): max number of frames. Defaults to None (all).
+
+    Returns:
+        list[dict]: the benchmark results
+    """
+    dataset = 'license-plate-data'
+    file_list, frames = load_dataset(dataset, limit)
+    results = []
+
+    outs, lat = timed_calls(pr.get_plate_view, [(frame,) for frame in frames])
+    results.append(latency_stats("PlateReader.get_plate_view", dataset, "single", len(frames), lat))
+
+    char_imgs = [pr.get_char_imgs(p_v) for p_v in outs if list(p_v)]
+    labels = [filename.split('.')[0].split('-')[1] for filename, p_v in zip(file_list, outs) if list(p_v)]
+    for mode, batched in (("single", False), ("batched", True)):
+        if not char_imgs:
+            break
+        preds, lat = timed_calls(lambda c_img: pr.characters(c_img, batched=batched), [(c_img,) for c_img in char_imgs])
+        res = latency_stats("PlateReader.characters", dataset, mode, len(char_imgs), lat)
+        res["accuracy"] = float(np.mean([p == l for p, l in zip(preds, labels)]))
+        results.append(res)
+
+    outs, lat = timed_calls(DataScraper.process_img, [(frame,) for frame in frames])
+    results.append(latency_stats("DataScraper.process_img", dataset, "single", len(frames), lat))
+    return results
+
+
+def git_commit():
+    """str: the current git commit of the repository, or None if unknown."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=SRC_PATH, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(out_path=RESULTS_PATH, limit=None):
+    """Runs the benchmark suite over the bundled datasets, and writes the results to a json file.
+
+    Args:
+        out_path (str, optional): json file to write the results to. Defaults to RESULTS_PATH.
+        limit (int, optional): max number of images per dataset. Defaults to None (all).
+
+    Returns:
+        dict: the results
+    """
+    pr = PlateReader(script_run=False)
+    results = suite_predict_char(pr, limit) + suite_plates(pr, limit)
+    out = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "backend": inference.DEFAULT_BACKEND,
+        "models": {
+            "alpha": os.path.basename(PATH_ALPHA_MODEL),
+            "num": os.path.basename(PATH_NUM_MODEL),
+            "id": os.path.basename(PATH_PARKING_ID)
+        },
+        "results": results
+    }
+    with open(out_path, 'w') as f:
+        json.dump(out, f, indent=2)
+    for res in results:
+        print("{:<28} {:<34} {:<8} {:>9.1f} items/s  p50 {:8.3f} ms".format(
+            res["name"], res["dataset"], res["mode"], res["items_per_sec"], res["latency_ms"]["p50"]))
+    return out
+
+
+def bench_characters(pr, frames, reps=REPS):
+    """Compares the per plate latency of the batched and the per character prediction in PlateReader.characters
+
+    Args:
+        pr (PlateReader): plate reader with the loaded models
+        frames (list[cv::Mat]): raw frames containing a license plate
+        reps (int, optional): number of timed calls per plate. Defaults to REPS.
+    """
+    print("----- PlateReader.characters (ms per plate) -----")
+    for frame in frames:
+        p_v = pr.get_plate_view(frame)
+        if not list(p_v):
+            continue
+        c_img = pr.get_char_imgs(p_v)
+        loop_ms = time_per_call(lambda: pr.characters(c_img, get_pred_vec=True, batched=False), reps)
+        batch_ms = time_per_call(lambda: pr.characters(c_img, get_pred_vec=True, batched=True), reps)
+        print("per char: {:.2f}, batched: {:.2f}, speedup: {:.2f}x".format(loop_ms, batch_ms, loop_ms / batch_ms))
+
+
+def bench_rectify(pr, frames, names, reps=REPS):
+    """Compares the plate reads and the per plate latency of the two stage crops of PlateRectifier (plate view, then
+    intermediate and model resolutions, as in training) with the single warp per crop.
+
+    Args:
+        pr (PlateReader): plate reader with the loaded models
+        frames (list[cv::Mat]): raw frames containing a license plate
+        names (list[str]): file names of the frames, P<id>-<license plate>.png
+        reps (int, optional): number of timed calls per plate. Defaults to REPS.
+    """
+    rectifiers = {
+        "two stage": pr.rectifier,
+        "single warp": PlateRectifier(CAR_WIDTH, CAR_HEIGHT, list(zip(pr.rectifier.boxes, pr.rectifier.sizes)))
+    }
+    print("----- PlateRectifier (ms per plate) -----")
+    stats = {name: {"plates": 0, "ids": 0, "lps": 0, "ms": []} for name in rectifiers}
+    for frame, filename in zip(frames, names):
+        plate_id, lp = os.path.splitext(filename)[0][1:].split('-')
+        quad = pr.plate_quad(frame)
+        if not len(quad):
+            continue
+        vecs = {}
+        for name, rectifier in rectifiers.items():
+            stats[name]["ms"].append(time_per_call(lambda: rectifier.rectify(quad, frame), reps))
+            crops = rectifier.rectify(quad, frame)
+            id_vec = pr.id_reader.predict_chars([crops[4]], id=True)[0]
+            pred_lp, lp_vecs = pr.plates_characters([crops[:4]])[0]
+            pred_id = pr.id_reader.interpret(id_vec)
+            stats[name]["plates"] += 1
+            stats[name]["ids"] += pred_id == plate_id
+            stats[name]["lps"] += pred_lp == lp
+            vecs[name] = lp_vecs
+            print("{} {}: {}{}".format(filename, name, pred_id, pred_lp))
+        print("{} max char probability shift: {:.3f}".format(filename, np.amax(np.abs(vecs["two stage"] - vecs["single warp"]))))
+    for name, st in stats.items():
+        print("{}: ids {}/{}, plates {}/{}, {:.3f} ms".format(name, st["ids"], st["plates"], st["lps"], st["plates"], 
+                                                             np.mean(st["ms"]) if st["ms"] else 0))
+
+
+def bench_drive_backends(frames, reps=REPS):
+    """Compares the drive cnn latency of every inference backend.
+
+    Args:
+        frames (list[cv::Mat]): raw frames to predict on
+        reps (int, optional): number of timed calls per frame. Defaults to REPS.
+    """
+    print("----- Model.predict (ms per frame) -----")
+    inputs = [DataScraper.process_img(frame) for frame in frames]
+    for backend in BACKENDS:
+        mod = Model(Driver.MODEL_PATH, backend=backend)
+        ms = np.mean([time_per_call(lambda: mod.predict(img), reps) for img in inputs])
+        print("{}: {:.2f}".format(backend, ms))
+
+
+def bench_roi(frames, reps=REPS):
+    """Compares the per check latency of processing the full frame and cropping after (previous behaviour), 
+    with cropping to the region of interest first. Also compares, for a whole driving frame, converting the regions 
+    on their own on top of the whole frame, with cropping them from the whole frame (see FrameContext.use_full_frame).
+
+    Args:
+        frames (list[cv::Mat]): raw frames
+        reps (int, optional): number of timed calls per frame. Defaults to REPS.
+    """
+    def drive_full(img):
+        hsv = ImageProcessor.filter(img, ImageProcessor.white_low, ImageProcessor.white_up)
+        hsv = DataScraper.compress(hsv, DataScraper.COMPRESSION_RATIO)
+        return ImageProcessor.crop(hsv, row_start=DataScraper.CROPPED_ROW_START)
+
+    def blue_full(img):
+        blu = ImageProcessor.filter(img, ImageProcessor.blue_low, ImageProcessor.blue_up)
+        return ImageProcessor.crop(blu, *Driver.BLUE_ROI)
+
+    def blue_roi(img):
+        return ImageProcessor.filter(ImageProcessor.crop(img, *Driver.BLUE_ROI), ImageProcessor.blue_low, ImageProcessor.blue_up)
+
+    def gray_full(img, roi):
+        return ImageProcessor.crop(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), *roi)
+
+    def gray_roi(img, roi):
+        return cv2.cvtColor(ImageProcessor.crop(img, *roi), cv2.COLOR_BGR2GRAY)
+
+    checks = {
+        "drive": (drive_full, DataScraper.process_img),
+        "blue area": (blue_full, blue_roi),
+        "crosswalk": (lambda img: gray_full(img, Driver.CROSSWALK_ROI), lambda img: gray_roi(img, Driver.CROSSWALK_ROI)),
+        "truck": (lambda img: gray_full(img, Driver.TRUCK_ROI), lambda img: gray_roi(img, Driver.TRUCK_ROI))
+    }
+    print("----- region of interest first (ms per frame) -----")
+    for name, (full, roi) in checks.items():
+        full_ms = np.mean([time_per_call(lambda: full(frame), reps) for frame in frames])
+        roi_ms = np.mean([time_per_call(lambda: roi(frame), reps) for frame in frames])
+        print("{}: full {:.3f}, roi {:.3f}, saved {:.3f}".format(name, full_ms, roi_ms, full_ms - roi_ms))
+
+    def driving_frame(img, full):
+        # the checks of a driving frame, in the driver's order (see Driver.process_frame)
+        ctx = FrameContext(img)
+        if full:
+            ctx.use_full_frame()
+        DataScraper.process_img(img, ctx=ctx)
+        ctx.contours_area(ImageProcessor.blue_low, ImageProcessor.blue_up, roi=Driver.BLUE_ROI)
+        ctx.contours_area(ImageProcessor.red_low, ImageProcessor.red_up, 2)
+        ctx.contours(ImageProcessor.plate_low, ImageProcessor.plate_up, plate=True)
+
+    # per frame, the regions are either converted on their own before the whole frame, or cropped from it
+    roi_ms = np.mean([time_per_call(lambda: driving_frame(frame, False), reps) for frame in frames])
+    full_ms = np.mean([time_per_call(lambda: driving_frame(frame, True), reps) for frame in frames])
+    print("driving frame: regions then frame {:.3f}, frame only {:.3f}, saved {:.3f}".format(roi_ms, full_ms, roi_ms - full_ms))
+
+
+def bench_contours(frames, reps=REPS):
+    """Compares the per check latency of the previous contour areas (RETR_TREE, CHAIN_APPROX_NONE and a full sort), 
+    with contour_analysis (outer contours only, compressed, partial selection), and with connected components.
+    Also prints the largest relative difference of the top areas with the previous ones.
+
+    Args:
+        frames (list[cv::Mat]): raw frames
+        reps (int, optional): number of timed calls per frame. Defaults to REPS.
+    """
+    def tree_areas(img, nums):
+        contours, hierarchy = cv2.findContours(image=img, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE)
+        cs = sorted(contours, key=cv2.contourArea, reverse=True)[:nums]
+        return [cv2.contourArea(c) for c in cs]
+
+    def rel_diff(ref, areas):
+        if len(ref) != len(areas):
+            return float('inf')
+        return max([abs(a - r) / max(r, 1) for r, a in zip(ref, areas)] or [0])
+
+    checks = {
+        "red line": (lambda img: ImageProcessor.filter(img, ImageProcessor.red_low, ImageProcessor.red_up), 2),
+        "blue area": (lambda img: ImageProcessor.filter(ImageProcessor.crop(img, *Driver.BLUE_ROI), 
+                                                        ImageProcessor.blue_low, ImageProcessor.blue_up), 1),
+        "plate": (lambda img: ImageProcessor.filter_plate(img, ImageProcessor.plate_low, ImageProcessor.plate_up), 1)
+    }
+    print("----- contour areas (ms per frame) -----")
+    for name, (binarize, nums) in checks.items():
+        imgs = [binarize(frame) for frame in frames]
+        tree_ms = np.mean([time_per_call(lambda: tree_areas(img, nums), reps) for img in imgs])
+        ext_ms = np.mean([time_per_call(lambda: contour_analysis.top_areas(img, nums), reps) for img in imgs])
+        cc_ms = np.mean([time_per_call(lambda: contour_analysis.component_areas(img, nums), reps) for img in imgs])
+        ext_diff = max(rel_diff(tree_areas(img, nums), contour_analysis.top_areas(img, nums)) for img in imgs)
+        cc_diff = max(rel_diff(tree_areas(img, nums), contour_analysis.component_areas(img, nums)) for img in imgs)
+        print("{}: tree {:.3f}, external {:.3f}, components {:.3f}, max area diff: external {:.1%}, components {:.1%}".format(
+            name, tree_ms, ext_ms, cc_ms, ext_diff, cc_diff))
+
+
+def bench_lut(frames, reps=REPS):
+    """Compares the per frame latency of the masks of every colour class from the hsv image (one conversion, 
+    then one range test per class), with ColorClassifier (one table lookup per pixel, then one bit test per class),
+    for exact and quantised tables. Also prints the share of pixels whose masks differ from the hsv ones,
+    and the latency of a single mask within the drive and blue regions (the driver's usual case, see Driver.LUT_MASKS).
+
+    Args:
+        frames (list[cv::Mat]): raw frames
+        reps (int, optional): number of timed calls per frame. Defaults to REPS.
+    """
+    def hsv_masks(img):
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        return [cv2.inRange(hsv, np.array(low), np.array(up)) for low, up in CLASSES.values()]
+
+    def lut_masks(classifier, img):
+        labels = classifier.labels(img)
+        return [ColorClassifier.mask(labels, bit) for bit in CLASSES]
+
+    print("----- colour masks (ms per frame) -----")
+    hsv_ms = np.mean([time_per_call(lambda: hsv_masks(frame), reps) for frame in frames])
+    print("hsv: {:.3f}".format(hsv_ms))
+    for bits in (8, 6, 5):
+        classifier = ColorClassifier(bits)
+        classifier.table()
+        lut_ms = np.mean([time_per_call(lambda: lut_masks(classifier, frame), reps) for frame in frames])
+        diff = np.mean([np.mean([np.mean(a != b) for a, b in zip(hsv_masks(frame), lut_masks(classifier, frame))]) 
+                        for frame in frames])
+        print("lut {} bits ({} KB): {:.3f}, pixels differing: {:.3%}".format(bits, classifier.table().nbytes // 1024, lut_ms, diff))
+
+    # per frame cost of the masks the driver actually uses, each within its region (see FrameContext.mask)
+    regions = {
+        "drive": (ImageProcessor.white_low, ImageProcessor.white_up, DataScraper.DRIVE_ROI),
+        "blue area": (ImageProcessor.blue_low, ImageProcessor.blue_up, Driver.BLUE_ROI)
+    }
+    classifier = ColorClassifier()
+    classifier.prepare(("bgr",))
+    for name, (low, up, roi) in regions.items():
+        hsv_ms = np.mean([time_per_call(lambda: FrameContext(frame).mask(low, up, roi), reps) for frame in frames])
+        lut_ms = np.mean([time_per_call(lambda: FrameContext(frame, classifier=classifier).mask(low, up, roi), reps) 
+                          for frame in frames])
+        print("{} region: hsv {:.3f}, lut {:.3f}".format(name, hsv_ms, lut_ms))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Perception benchmarks over the bundled datasets")
+    parser.add_argument("--out", default=RESULTS_PATH, help="json file to write the suite results to")
+    parser.add_argument("--limit", type=int, default=None, help="max number of images per dataset")
+    parser.add_argument("--compare", action="store_true", help="also run the comparisons of alternative implementations")
+    opts = parser.parse_args(args[1:])
+
+    run_suite(opts.out, opts.limit)
+    if opts.compare:
+        pr = PlateReader(script_run=False)
+        frames = load_frames()
+        bench_characters(pr, frames)
+        bench_rectify(pr, frames, sorted(os.listdir(LP_DATA_PATH)))
+        bench_drive_backends(frames)
+        bench_roi(frames)
+        bench_contours(frames)
+        bench_lut(frames)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -8,11 +8,8 @@ import sys
 import rospy
 import cv2
 import numpy as np
-
-import tensorflow as tf
-from tensorflow.keras import models
-from tensorflow.keras.utils import plot_model
 from PIL import Image
+from inference import load_backend, InputBuffer
 
 
 class CharReader:
@@ -21,9 +18,17 @@ class CharReader:
     Requires path of the neural net file
     """
 
-    def __init__(self, path):
-        self.model = models.load_model(path)
-        print(type(self.model))
+    def __init__(self, path, backend=None):
+        """Creates a CharReader object.
+
+        Args:
+            path (str): path where the trained model is saved.
+            backend (str, optional): name of the inference backend (see inference.BACKENDS). Defaults to inference.DEFAULT_BACKEND.
+        """
+        self.infer = load_backend(path, backend)
+        self.model = self.infer.model
+        self.inputs = InputBuffer(self.model.input_shape[1:])
+        print(type(self.model), type(self.infer))
 
     def predict_char(self, img, id=False):
         """Model prediction vector for a given image.
@@ -39,9 +44,25 @@ class CharReader:
             img = self.pre_processing_for_id(img)
         else:
             img = self.pre_processing_for_model(img)
-        img = img/255
-        img_aug = np.expand_dims(np.expand_dims(img, axis=-1), axis=0)
-        y_predict = self.model.predict(img_aug)[0]
+        y_predict = self.infer(self.inputs.fill([img]))[0]
+
+        return y_predict
+
+    def predict_chars(self, imgs, id=False):
+        """Model prediction vectors for several images, obtained with a single forward pass.
+
+        Args:
+            imgs (list[cv::Mat]): grayscaled images of characters.
+            id (bool, optional): True if the characters are for the top ID. Defaults to False.
+
+        Returns:
+            ndarray: 2D array, each row being the prediction vector of the corresponding image
+        """
+        if id:
+            batch = [self.pre_processing_for_id(img) for img in imgs]
+        else:
+            batch = [self.pre_processing_for_model(img) for img in imgs]
+        y_predict = self.infer(self.inputs.fill(batch))
 
         return y_predict
 
@@ -84,10 +105,7 @@ class CharReader:
             image: formatted image
         """
 
-        resize = cv2.resize(im, (15, 30))
-        gray = cv2.cvtColor(resize, cv2.COLOR_BGR2GRAY)
-
-        return gray
+        return CharReader.format_img(im, (15, 30))
 
     def pre_processing_for_model(self, im):
         """Formats image to dimensions for use in neural net
@@ -98,10 +116,24 @@ class CharReader:
         Returns:
             image: formatted image
         """
-        resize = cv2.resize(im, (15, 29))
-        gray = cv2.cvtColor(resize, cv2.COLOR_BGR2GRAY)
+        return CharReader.format_img(im, (15, 29))
+
+    @staticmethod
+    def format_img(im, res):
+        """Resizes and grayscales an image, skipping what is already done (e.g. crops from PlateRectifier).
+
+        Args:
+            im (image): bgr or grayscaled image
+            res (tuple[int]): width and height of the model input
 
-        return gray
+        Returns:
+            image: grayscaled image of size res
+        """
+        if im.shape[1] != res[0] or im.shape[0] != res[1]:
+            im = cv2.resize(im, res)
+        if im.ndim == 3:
+            im = cv2.cvtColor(im, cv2.COLOR_BGR2GRAY)
+        return im
 
     def model_summary(self):
         """Returns model summary"""
@@ -129,6 +161,7 @@ def main(args):
 
 
 if __name__ == '__main__':
+    from tensorflow.keras import models
     path = '/home/fizzer/ros_ws/src/models/license_plate_model1.h5'
     print('***** loading model *****')
     model = models.load_model(path)
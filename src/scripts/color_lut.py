@@ -0,0 +1,123 @@
+import threading
+import cv2
+import numpy as np
+
+import startup
+from hsv_view import ImageProcessor
+
+"""Classes of colour, one bit each in a label image"""
+RED = 1
+BLUE = 2
+WHITE = 4
+PLATE = 8
+CLASSES = {
+    RED: (ImageProcessor.red_low, ImageProcessor.red_up),
+    BLUE: (ImageProcessor.blue_low, ImageProcessor.blue_up),
+    WHITE: (ImageProcessor.white_low, ImageProcessor.white_up),
+    PLATE: (ImageProcessor.plate_low, ImageProcessor.plate_up)
+}
+
+
+class ColorClassifier:
+    """This class classifies every pixel of a frame into all the colour classes at once, with a precomputed lookup table
+    from the pixel's channels to the bits of the classes whose hsv range contains it.
+
+    One table lookup per pixel replaces the hsv conversion and the range test of every class, and the mask of a class
+    is then a bit test of the label image. With 8 bits per channel the table is exact (same masks as cv2.inRange on
+    the hsv image), with fewer bits the channels are quantised to the center of their bin, for a table that fits in cache.
+    Building an exact table takes about a second: build it off the control path (see prepare), masks being
+    computed from the hsv image until it is ready.
+    """
+    BITS = 8
+
+    def __init__(self, bits=BITS, classes=CLASSES):
+        """Creates a ColorClassifier object. The tables are built by prepare, or on first use.
+
+        Args:
+            bits (int, optional): bits kept per channel, the table having 2**(3*bits) entries. Defaults to BITS.
+            classes (dict[int, tuple], optional): bit -> (hsv_low, hsv_up) of every class. Defaults to CLASSES.
+        """
+        self.bits = bits
+        self.classes = dict(classes)
+        self.bits_of = {(tuple(low), tuple(up)): bit for bit, (low, up) in self.classes.items()}
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def bit(self, hsv_low, hsv_up):
+        """int: the bit of the class with an hsv range, None if it is not a class of this classifier."""
+        return self.bits_of.get((tuple(hsv_low), tuple(hsv_up)))
+
+    def table(self, type="bgr"):
+        """Obtains the lookup table for a channel order, building it on first use.
+
+        Args:
+            type (str, optional): channel order of the frames, "bgr" or "rgb". Defaults to "bgr".
+
+        Returns:
+            ndarray: the class bits of every quantised pixel value, indexed by c0 | c1 << bits | c2 << 2*bits
+        """
+        with self.lock:
+            if type not in self.tables:
+                with startup.timed("colour lookup table (" + type + ")"):
+                    self.tables[type] = self.build(type)
+            return self.tables[type]
+
+    def ready(self, type="bgr"):
+        """bool: True if the lookup table for a channel order has been built."""
+        return type in self.tables
+
+    def prepare(self, types=("bgr", "rgb")):
+        """Builds the lookup tables ahead of time (e.g. in a background thread), so that no frame waits for them.
+
+        Args:
+            types (tuple[str], optional): channel orders of the frames. Defaults to both "bgr" and "rgb".
+        """
+        for type in types:
+            self.table(type)
+
+    def build(self, type):
+        """Builds the lookup table for a channel order (see table).
+        """
+        levels = 2**self.bits
+        step = 256 // levels
+        v = (np.arange(levels)*step + step // 2).astype(np.uint8)
+        c2, c1, c0 = np.meshgrid(v, v, v, indexing='ij')
+        grid = np.stack((c0.ravel(), c1.ravel(), c2.ravel()), axis=-1).reshape(-1, 1, 3)
+        hsv = cv2.cvtColor(grid, cv2.COLOR_RGB2HSV if type == "rgb" else cv2.COLOR_BGR2HSV)
+        table = np.zeros(levels**3, dtype=np.uint8)
+        for bit, (low, up) in self.classes.items():
+            table[cv2.inRange(hsv, np.array(low), np.array(up)).ravel() > 0] |= bit
+        return table
+
+    def labels(self, img, type="bgr"):
+        """Classifies every pixel of an image.
+
+        Args:
+            img (cv::Mat): image data
+            type (str, optional): channel order of the image, "bgr" or "rgb". Defaults to "bgr".
+
+        Returns:
+            cv::Mat: the label image, with the bits of the classes of every pixel
+        """
+        table = self.table(type)
+        if self.bits == 8:
+            # 4 bytes per pixel read as a little endian int: c0 | c1 << 8 | c2 << 16 | alpha << 24
+            idx = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA).view('<u4')[..., 0] & 0xFFFFFF
+        else:
+            s = 8 - self.bits
+            c = [(img[..., i] >> s).astype(np.uint32) for i in range(3)]
+            idx = c[0] | (c[1] << self.bits) | (c[2] << 2*self.bits)
+        return table[idx]
+
+    @staticmethod
+    def mask(labels, bit):
+        """Binary mask of a class, same as cv2.inRange on the hsv image.
+
+        Args:
+            labels (cv::Mat): label image (see labels)
+            bit (int): bit of the class
+
+        Returns:
+            cv::Mat: the binary image, 255 within the class
+        """
+        return cv2.compare(np.bitwise_and(labels, bit), 0, cv2.CMP_GT)
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+"""Contour analysis of binary images, shared by every module looking for the largest blobs of a colour.
+
+Contours are retrieved without their hierarchy, and with their straight segments compressed to their end points
+(same areas and perimeters as the full point lists). Only the outer contours are retrieved, unless nested ones are
+needed (e.g. a plate within a hole of a larger blob). The largest contours are selected with a partial selection
+instead of sorting all of them.
+"""
+
+
+def find(img, nested=False):
+    """Finds the contours of a binary image.
+
+    Args:
+        img (cv::Mat): binary image, any non zero pixel being foreground
+        nested (bool, optional): True to also retrieve the contours within holes. Defaults to False (outer contours only).
+
+    Returns:
+        tuple[list, ndarray]: the contours, and their areas
+    """
+    mode = cv2.RETR_LIST if nested else cv2.RETR_EXTERNAL
+    contours, hierarchy = cv2.findContours(image=img, mode=mode, method=cv2.CHAIN_APPROX_SIMPLE)
+    areas = np.array([cv2.contourArea(c) for c in contours], dtype=np.float64)
+    return list(contours), areas
+
+
+def top_indices(areas, nums=None, min_area=0):
+    """Indices of the largest areas, in descending order.
+
+    Args:
+        areas (ndarray): areas
+        nums (int, optional): max number of indices. Defaults to None (all).
+        min_area (float, optional): min area. Defaults to 0.
+
+    Returns:
+        ndarray: the indices
+    """
+    idx = np.flatnonzero(areas >= min_area) if min_area > 0 else np.arange(len(areas))
+    if nums is not None and nums < len(idx):
+        # only the top nums are sorted
+        idx = idx[np.argpartition(-areas[idx], nums - 1)[:nums]]
+    return idx[np.argsort(-areas[idx], kind='stable')]
+
+
+def top(contours, areas, nums=None, min_area=0):
+    """Largest contours, in descending order of area (see top_indices).
+
+    Returns:
+        tuple[list, list[float]]: the contours, and their areas
+    """
+    idx = top_indices(areas, nums, min_area)
+    return [contours[i] for i in idx], [float(areas[i]) for i in idx]
+
+
+def largest(img, nested=False):
+    """Largest contour of a binary image.
+
+    Args:
+        img (cv::Mat): binary image
+        nested (bool, optional): see find. Defaults to False.
+
+    Returns:
+        ndarray: the largest contour, or empty list if there is none
+    """
+    contours, areas = find(img, nested)
+    if not contours:
+        return []
+    return contours[int(np.argmax(areas))]
+
+
+def top_areas(img, nums=1):
+    """Largest contour areas of a binary image.
+
+    Args:
+        img (cv::Mat): binary image
+        nums (int, optional): number of top contour areas to obtain. Defaults to 1.
+
+    Returns:
+        list[float]: the top contour areas, sorted in descending order
+    """
+    contours, areas = find(img)
+    return [float(areas[i]) for i in top_indices(areas, nums)]
+
+
+def component_areas(img, nums=1):
+    """Largest connected component areas of a binary image, without any contour.
+
+    Unlike contour areas, these are pixel counts, which do not include holes, nor are they reduced
+    by half the perimeter: thresholds tuned for one do not apply to the other.
+
+    Args:
+        img (cv::Mat): binary image
+        nums (int, optional): number of top areas to obtain. Defaults to 1.
+
+    Returns:
+        list[float]: the top component areas, sorted in descending order
+    """
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats((img > 0).view(np.uint8), connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA].astype(np.float64)  # without the background
+    return [float(areas[i]) for i in top_indices(areas, nums)]
@@ -1,3 +1,6 @@
+import time
+IMPORT_START = time.perf_counter()
+
 from geometry_msgs.msg import Twist
 import rospy
 import cv2
@@ -8,13 +11,27 @@ import numpy as np
 from time import sleep
 
 from hsv_view import ImageProcessor
-from model import Model
 from scrape_frames import DataScraper
 from plate_reader import PlateReader
 from pull_plate import PlatePull
-import time
+from frame_context import FrameContext
+from color_lut import ColorClassifier
+from ros_image import imgmsg_to_array
+from motion import MotionDetector
+from plate_tracker import PlateTracker
+from plate_evidence import PlateEvidence
+from plate_publisher import PlatePublisher
+from prediction_store import PredictionStore
+from frame_worker import FrameWorker
+from plate_process import PlateProcess
+from model_server import get_server
+import startup
+from startup import LazyModel, ModelLoader
+import instrument
 from std_msgs.msg import String
 
+IMPORT_SECS = time.perf_counter() - IMPORT_START
+
 class Driver:
     DEF_VALS = (0.5, 0.5)
     MODEL_PATH = "/home/fizzer/ros_ws/src/models/drive_model-0.h5"
@@ -56,6 +73,19 @@ class Driver:
     SLOW_DOWN_Z_INNER = 0.8
 
     MIN_INNER_ID_FREQ = 3
+
+    """Plate tracking: reads of a tracked plate are skipped once its ID has TRACK_MIN_ID_FREQ predictions, 
+    and its best license plate has TRACK_MIN_LP_FREQ predictions and TRACK_MIN_LP_SHARE of the ID's predictions"""
+    TRACK_MIN_ID_FREQ = 3
+    TRACK_MIN_LP_FREQ = 3
+    TRACK_MIN_LP_SHARE = 0.6
+
+    """Plate evidence: a plate ID is settled, and its plate is no longer read nor slowed down for, once the 
+    posterior of its best license plate reaches SETTLE_PROB over at least SETTLE_MIN_OBS distinct predictions, 
+    each weighted by SETTLE_OBS_WEIGHT as consecutive frames are correlated (see PlateEvidence)"""
+    SETTLE_PROB = 0.99
+    SETTLE_MIN_OBS = 5
+    SETTLE_OBS_WEIGHT = 0.5
     """transition"""
     STRAIGHT_DEGS_THRES = 0.3
     RED_INTERSEC_PIX = 445
@@ -75,26 +105,79 @@ class Driver:
 
     INNER_X = 0.5
 
-    def __init__(self):
+    """Colour masks from a single lookup per pixel (see ColorClassifier), instead of an hsv conversion and range tests.
+    Off: on the drive and check regions, the lookups are no faster than the range tests (see benchmark.bench_lut)"""
+    LUT_MASKS = False
+
+    """Stage latencies are published every LATENCY_PUB_FRAMES frames"""
+    LATENCY_PUB_FRAMES = FPS*5
+
+    """Regions of interest (row_start, row_end, col_start, col_end), -1 if no change (see ImageProcessor.crop).
+    Checks crop to their region before any conversion or filtering."""
+    BLUE_ROI = (int(ROWS/2.5), -1, -1, -1)
+    BLUE_TURN_ROI = (int(ROWS/2.2), -1, -1, -1)
+    CROSSWALK_ROI = (180, ROWS-180, 320, COLS-320)
+    TRUCK_ROI = (int(ROWS/3), int(2*ROWS/3), int(COLS/2.65), int(2*COLS/2.65))
+
+    def __init__(self, async_worker=True, plate_process=False, script_run=True, twist_pub=None, license_pub=None, clock=None):
         """Creates a Driver object. Responsible for driving the robot throughout the track. 
+
+        Args:
+            async_worker (bool, optional): True to process frames in a worker thread, on the latest frame only, 
+                instead of inside the subscriber callback. Defaults to True.
+            plate_process (bool, optional): True to read license plates in a separate process, with its own models. 
+                Defaults to False.
+            script_run (bool, optional): True to subscribe to the camera and show debug views. False when frames 
+                are fed to callback_img directly (e.g. replay). Defaults to True.
+            twist_pub (rospy.Publisher, optional): publisher of the velocities. Defaults to a /R1/cmd_vel publisher.
+            license_pub (rospy.Publisher, optional): publisher of the plates. Defaults to a /license_plate publisher.
+            clock (function, optional): function of an image message returning its time in secs (e.g. its header stamp), 
+                for the timed state changes to depend on the frames only (e.g. replay). Timing then starts at the first frame. 
+                Defaults to None (wall clock, from the creation of the driver).
         """            
-        self.twist_pub = rospy.Publisher('/R1/cmd_vel', Twist, queue_size=1)
-        self.image_sub = rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback_img)
-        self.license_pub = rospy.Publisher("/license_plate", String, queue_size=1)
+        if twist_pub is None:
+            twist_pub = rospy.Publisher('/R1/cmd_vel', Twist, queue_size=1)
+        if license_pub is None:
+            license_pub = rospy.Publisher("/license_plate", String, queue_size=1)
+        self.twist_pub = twist_pub
+        self.license_pub = license_pub
+        self.show_views = script_run
+        self.latency_pub = None
+        if script_run:
+            self.latency_pub = rospy.Publisher("/perception_latency", String, queue_size=1)
+        self.frames_count = 0
         self.move = Twist()
         self.bridge = CvBridge()
 
         self.move.linear.x = 0
         self.move.angular.z = 0
 
-        self.dv_mod = Model(Driver.MODEL_PATH)
-        self.inner_dv_mod = Model(Driver.INNER_MOD_PATH)
-        self.pr = PlateReader(script_run=False)
+        # models are loaded in the background during the start sequence, which does not need them
+        server = get_server()
+        self.dv_mod = LazyModel("drive model", lambda: server.model(Driver.MODEL_PATH))
+        self.inner_dv_mod = LazyModel("inner drive model", lambda: server.model(Driver.INNER_MOD_PATH))
+        self.plate_proc = None
+        self.pr = None
+        handles = [self.dv_mod]
+        if plate_process:
+            self.plate_proc = PlateProcess(lut_masks=Driver.LUT_MASKS)
+        else:
+            self.pr = LazyModel("plate reader", lambda: PlateReader(script_run=False))
+            handles.append(self.pr)
+        handles.append(self.inner_dv_mod)
+        # the colour lookup tables are built with the models, masks being range tested until then
+        self.classifier = ColorClassifier() if Driver.LUT_MASKS else None
+        def preload():
+            server.configure()
+            if self.classifier is not None:
+                self.classifier.prepare()
+        self.model_loader = ModelLoader(handles, preload=preload)
+        self.model_loader.start()
         """crosswalk"""
         self.is_stopped_crosswalk = False
         self.first_ped_moved = False
         self.first_ped_stopped = False
-        self.prev_mse_frame = None
+        self.crosswalk_motion = MotionDetector()
         self.crossing_crosswalk_count = 0
         self.is_crossing_crosswalk = False
         self.first_stopped_frames_count = 0
@@ -107,14 +190,17 @@ class Driver:
         self.num_fast_frames = 0
         
         """license plate predictions"""
-        self.lp_dict = {}
-        self.id_dict = {}
-        self.id_stats_dict = {}
+        self.preds = PredictionStore()
+        self.plate_evidence = PlateEvidence(Driver.SETTLE_PROB, Driver.SETTLE_MIN_OBS, Driver.SETTLE_OBS_WEIGHT)
+        self.plate_tracker = PlateTracker(self.is_plate_confident, self.plate_evidence.is_settled)
+        self.plate_pub = PlatePublisher(self.license_pub, self.is_plate_confident)
 
         """Loop control"""
         self.num_crosswalks = 0
         self.first_crosswalk_stop = True
-        self.start = time.time()
+        self.clock = clock
+        self.start = time.time() if clock is None else None
+        self.now = self.start
         self.curr_t = self.start
         self.outside_ended = False
         self.acquire_lp = False
@@ -136,16 +222,40 @@ class Driver:
         self.was_truck_out = False
         self.truck_test_complete = False
         self.truck_frames_count = 0
-        self.prev_mse_truck = None
+        self.truck_motion = MotionDetector()
 
         self.end_state = False
         self.results = {}
         self.id_int = 0
 
+        """Frame processing"""
+        self.worker = None
+        if not script_run:
+            self.image_sub = None
+        elif async_worker:
+            self.worker = FrameWorker(self.callback_img)
+            self.worker.start()
+            self.image_sub = rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.worker.submit, queue_size=1)
+        else:
+            self.image_sub = rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback_img)
+
     def callback_img(self, data):
         """Callback function for the subscriber node for the /image_raw ros topic. 
-        This callback is called when a new message has arrived to the /image_raw topic (i.e. a new frame from the camera).
-        Using the image, it conducts the following:
+        This callback is called when a new message has arrived to the /image_raw topic (i.e. a new frame from the camera),
+        or by the frame worker on the latest message when running asynchronously.
+        Processes the frame (see process_frame), timing its stages, and periodically publishes the stage latencies.
+
+        Args:
+            data (sensor_msgs::Image): The image recieved from the robot's camera
+        """
+        with instrument.stage("callback_img"):
+            self.process_frame(data)
+        self.frames_count += 1
+        if self.latency_pub is not None and self.frames_count % Driver.LATENCY_PUB_FRAMES == 0:
+            self.latency_pub.publish(String(instrument.PROFILER.to_json()))
+
+    def process_frame(self, data):
+        """Processes a new frame from the camera. Using the image, it conducts the following:
 
         1) drives and looks for a red line (if not crossing the crosswalk)
         2) if a red line is seen, stops the robot
@@ -154,6 +264,9 @@ class Driver:
         Args:
             data (sensor_msgs::Image): The image recieved from the robot's camera
         """
+        self.now = time.time() if self.clock is None else self.clock(data)
+        if self.start is None:
+            self.start = self.curr_t = self.now
         if self.end_state:
             output_publish = String('TeamYoonifer,multi21,-1,AA00')
             self.license_pub.publish(output_publish)
@@ -161,13 +274,17 @@ class Driver:
         if self.start_seq_state:
             self.start_seq()
             return
-        cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+        with instrument.stage("convert"):
+            cv_image, type = imgmsg_to_array(data)
+            ctx = FrameContext(cv_image, type, self.classifier)
         if self.publish_state_inner:
             if self.id_int < 9:
-                self.get_plate_results2(self.id_int, inner=True)
-                self.id_int += 1
+                # IDs whose streamed plate is unchanged are skipped within the same frame
+                published = False
+                while self.id_int < 9 and not published:
+                    published = self.get_plate_results2(self.id_int, inner=True)
+                    self.id_int += 1
             else:
-                self.post_process_preds(inner=True)
                 self.end_state = True
                 self.publish_state_inner = False
                 print("RESULTS", self.results)
@@ -177,7 +294,7 @@ class Driver:
             # Facing the inner loop, executes the inner loop sequence by driving in and merging, only when the truck has been past
             # STATE CHANGE: start inner loop --> inner loop
             if not self.truck_test_complete:
-                if self.can_enter_inner(cv_image):
+                if self.can_enter_inner(ctx):
                     self.truck_test_complete = True
                 return
             self.inner_loop_seq()
@@ -185,15 +302,23 @@ class Driver:
                 self.inner_loop = True
             return
         if self.inner_loop:
-            self.predict_zone(cv_image, inner=True)
-            self.predict_if_in_zone(cv_image, inner=True)
-
-            self.twist_pub.publish(self.move)
-            if '7' in self.id_dict and '8' in self.id_dict and Driver.MIN_INNER_ID_FREQ < self.id_stats_dict['7'][0] and Driver.MIN_INNER_ID_FREQ < self.id_stats_dict['8'][0]:
+            if self.plate_proc is None:
+                # the plate extraction converts the whole frame, the regions are cropped from it
+                ctx.use_full_frame()
+            self.predict_zone(ctx, inner=True)
+            self.predict_if_in_zone(ctx, inner=True)
+
+            with instrument.stage("publish"):
+                self.twist_pub.publish(self.move)
+            if Driver.MIN_INNER_ID_FREQ < self.preds.id_count('7') and Driver.MIN_INNER_ID_FREQ < self.preds.id_count('8'):
                 # at least several good ID readings for both
                 self.inner_loop = False
                 self.publish_state_inner = True
-            if (time.time() - self.start) > Driver.END_SECS:
+            elif self.plate_evidence.is_settled('7') and self.plate_evidence.is_settled('8'):
+                # both inner plates already known with confidence
+                self.inner_loop = False
+                self.publish_state_inner = True
+            if (self.now - self.start) > Driver.END_SECS:
                 self.inner_loop = False
                 self.publish_state_inner = True
             return
@@ -206,7 +331,7 @@ class Driver:
             # Only to be ran when outside predictions updated (stopped at crosswalk and ended outside). Gets the license plate ID and combo results to be published.
             # Straightens the robot to the red line, then backs up beside a crosswalk.
             # STATE CHANGE: in transition --> turning transition (turning to face inner loop)
-            z_st, x_st = self.is_straightened(cv_image)
+            z_st, x_st = self.is_straightened(ctx)
             z = 0
             x = 0
             z = -1.0*z_st / 10
@@ -227,10 +352,11 @@ class Driver:
             print("\n\n")
             print("PLATE RESULTS")
             if self.id_int < 7:
-                self.get_plate_results2(self.id_int, inner=False)
-                self.id_int += 1
+                published = False
+                while self.id_int < 7 and not published:
+                    published = self.get_plate_results2(self.id_int, inner=False)
+                    self.id_int += 1
             else:                
-                self.post_process_preds(inner=False)      
                 print("\n\n")
                 print(self.results)
                 print("PRINTING STATS")
@@ -238,7 +364,7 @@ class Driver:
                 self.in_transition = True
                 self.update_preds_state = False
             return
-        self.curr_t = time.time()
+        self.curr_t = self.now
         if (self.curr_t - self.start) > Driver.OUTSIDE_LOOP_SECS and self.num_crosswalks >= Driver.NUM_CROSSWALK_STOP and self.is_stopped_crosswalk:
             # Stops the robot and considered outside loop run has ended when: past the set time, visited a number of crosswalks, and currently stopped at a crosswalk. 
             # STATE CHANGE: outside loop --> update predictions
@@ -255,17 +381,20 @@ class Driver:
                 self.num_crosswalks += 1
                 self.first_crosswalk_stop = False
             print("stopped crosswalk")
-            if self.can_cross_crosswalk(cv_image):
+            if self.can_cross_crosswalk(ctx):
                 print("can cross")
                 self.is_stopped_crosswalk = False
-                self.prev_mse_frame = None
+                self.crosswalk_motion.reset()
                 self.first_ped_stopped = False
                 self.first_ped_moved = False
                 self.is_crossing_crosswalk = True
                 self.first_crosswalk_stop = True
                 # self.num_crosswalks += 1
             return
-        self.predict_zone(cv_image, inner=False)
+        if self.plate_proc is None or not self.is_crossing_crosswalk:
+            # the plate extraction and the red line check convert the whole frame, the regions are cropped from it
+            ctx.use_full_frame()
+        self.predict_zone(ctx, inner=False)
         if self.is_crossing_crosswalk:
             # crossing the crosswalk. does not look for the red line at this period and drives faster.
             self.crossing_crosswalk_count += 1
@@ -276,7 +405,7 @@ class Driver:
             self.move.linear.x = x
             self.is_crossing_crosswalk = self.crossing_crosswalk_count < Driver.DRIVE_PAST_CROSSWALK_FRAMES  
             # print("crossing")
-        if not self.is_crossing_crosswalk and self.is_red_line_close(cv_image):
+        if not self.is_crossing_crosswalk and self.is_red_line_close(ctx):
             # check if red line close only when not crossing
             self.crossing_crosswalk_count = 0 
             print("checking for red line")
@@ -284,28 +413,30 @@ class Driver:
             self.move.angular.z = 0.0
             self.is_stopped_crosswalk = True
             self.first_stopped_frame = True
-        self.predict_if_in_zone(cv_image)
+        self.predict_if_in_zone(ctx)
         try:
-            self.twist_pub.publish(self.move)
-            pass
+            with instrument.stage("publish"):
+                self.twist_pub.publish(self.move)
         except CvBridgeError as e: 
             print(e)
 
-    def predict_zone(self, cv_image, inner=False):
+    def predict_zone(self, ctx, inner=False):
         """Predicts the velocity for the robot to drive at. Decreases its speed if close enough to license plates
         and allows predictions to be valid.
 
         Args:
-            cv_image (cv::Mat): Raw image data from gazebo.
+            ctx (FrameContext): context of the raw image data from gazebo.
             inner (bool, optional): True if called when in the inner loop. Defaulted to False.
         """        
-        hsv = DataScraper.process_img(cv_image, type="bgr")
+        with instrument.stage("process_img"):
+            hsv = DataScraper.process_img(ctx.img, type=ctx.type, ctx=ctx)
         
         predicted = None
-        if inner:
-            predicted = self.inner_dv_mod.predict(hsv)
-        else:
-            predicted = self.dv_mod.predict(hsv)
+        with instrument.stage("drive_cnn"):
+            if inner:
+                predicted = self.inner_dv_mod.predict(hsv)
+            else:
+                predicted = self.dv_mod.predict(hsv)
 
         pred_ind = np.argmax(predicted)
         self.move.linear.x = Driver.ONE_HOT[pred_ind][0]
@@ -316,11 +447,12 @@ class Driver:
             elif self.move.linear.x < 0:
                 self.move.linear.x = -1*Driver.INNER_X
             
-        r_st = int(Driver.ROWS/2.5)
-        crped = ImageProcessor.crop(cv_image, row_start=r_st)
-        blu_area = PlatePull.get_contours_area(ImageProcessor.filter(crped, ImageProcessor.blue_low, ImageProcessor.blue_up))
+        with instrument.stage("blue_area"):
+            blu_area = ctx.contours_area(ImageProcessor.blue_low, ImageProcessor.blue_up, roi=Driver.BLUE_ROI)
 
-        if blu_area and blu_area[0] > Driver.SLOW_DOWN_AREA_LOWER and blu_area[0] < Driver.SLOW_DOWN_AREA_UPPER or self.num_fast_frames < Driver.SLOW_DOWN_AREA_FRAMES:
+        # no need to slow down for a plate that is already known
+        settled = self.plate_evidence.is_settled(self.plate_tracker.plate_id)
+        if not settled and (blu_area and blu_area[0] > Driver.SLOW_DOWN_AREA_LOWER and blu_area[0] < Driver.SLOW_DOWN_AREA_UPPER or self.num_fast_frames < Driver.SLOW_DOWN_AREA_FRAMES):
             # Assumes close to a license plate, slows down and allows the prediction to be considered
             x = round(self.move.linear.x, 6) 
             z = round(self.move.angular.z, 6)
@@ -347,43 +479,55 @@ class Driver:
             # predicted license plate but not considered
             self.acquire_lp = False
 
-    def predict_if_in_zone(self, cv_image, inner=False):
+    def predict_if_in_zone(self, ctx, inner=False):
         """Updates the license plate ID and char predictions that were made by the model, only if 
         in a state to do so (i.e. predictions close to the LP)
 
         Args:
-            cv_image (cv::Mat): Raw image data from gazebo.
+            ctx (FrameContext): context of the raw image data from gazebo.
             inner (bool, optional): True if called when in the inner loop. Defaulted to False.
         """        
-        pred_id, pred_id_vec = self.pr.prediction_data_id(cv_image)
-        if pred_id:
-            pred_lp, pred_lp_vecs = self.pr.prediction_data_license(cv_image)
-            if pred_lp and self.acquire_lp:
+        if self.plate_proc is not None and self.plate_proc.failed:
+            print("plate process failed, reading plates in this process")
+            self.plate_proc.close()
+            self.plate_proc = None
+            self.pr = LazyModel("plate reader", lambda: PlateReader(script_run=False))
+        if self.plate_proc is not None:
+            # results arrive frames later from the plate process, with the state at the time of submission
+            for seq, res_inner, plates in self.plate_proc.poll():
+                for pred_id, pred_id_vec, pred_lp, pred_lp_vecs in plates:
+                    if pred_id and pred_lp:
+                        self.update_predictions(pred_id, pred_id_vec, pred_lp, pred_lp_vecs, res_inner)
+            self.plate_proc.submit(ctx.img, ctx.type, read_lp=self.acquire_lp, inner=inner)
+            return
+        # the license plate is only read when slowed down, as it is discarded otherwise
+        # every plate in view is read in the same batch
+        plates = self.pr.read_plates(ctx.img, ctx, read_lp=self.acquire_lp, tracker=self.plate_tracker)
+        for pred_id, pred_id_vec, pred_lp, pred_lp_vecs in plates:
+            if pred_id and pred_lp:
                 # only update predictions if there has been a prediction and when slowed down 
                 self.update_predictions(pred_id, pred_id_vec, pred_lp, pred_lp_vecs, inner)
 
-    def can_enter_inner(self, img):
+    def can_enter_inner(self, ctx):
         """Determines wheter or not the robot can enter in the inner loop, when faced towards it at
         an intersection. Specifically, it will move when the truck has passed the intersection
 
         Args:
-            img (cv::Mat): Raw image data from gazebo
+            ctx (FrameContext): context of the raw image data from gazebo
 
         Returns:
             bool: True if the robot can enter the inner loop.
         """        
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        img_gray = ImageProcessor.crop(img_gray, int(Driver.ROWS/3), int(2*Driver.ROWS/3), int(Driver.COLS/2.65), int(2*Driver.COLS/2.65))
+        img_gray = ctx.gray(Driver.TRUCK_ROI)
 
-        if self.prev_mse_truck is None:
-            self.prev_mse_truck = img_gray
+        mse = self.truck_motion.update(img_gray)
+        if mse is None:
             return False
-        cv2.imshow("truck find", img_gray)
-        cv2.waitKey(1)
-        mse = ImageProcessor.compare_frames(self.prev_mse_truck, img_gray)
+        if self.show_views:
+            cv2.imshow("truck find", img_gray)
+            cv2.waitKey(1)
         print("mse:", mse)
         print("truck in, truck out:" , self.was_truck_in, self.was_truck_out)
-        self.prev_mse_truck = img_gray
         
         if self.truck_frames_count <= int(Driver.TRUCK_STOP_SECS*Driver.FPS):
             self.truck_frames_count += 1
@@ -393,7 +537,7 @@ class Driver:
             if not self.was_truck_out:
                 self.was_truck_out = True
             if self.was_truck_in and self.was_truck_out:
-                self.prev_mse_truck = None
+                self.truck_motion.reset()
                 self.truck_frames_count = 0
                 print("truck in, truck out:" , self.was_truck_in, self.was_truck_out)
                 return True
@@ -405,33 +549,8 @@ class Driver:
 
         return False
 
-    def post_process_preds(self, inner=False, min_prob=-1):
-        """Post processes the predictions. Specifically, averages the prediction vector for all obtained predictions (previously, was a sum). 
-        Args:
-            inner (bool, optional): True if called when in the inner loop. Defaulted to False.
-            min_prob (int, optional): Min probabilty that is accepted as a valid prediction. Only accepted if all maximum probabilities for each character is above this value. Defaults to -1.
-        """        
-        for id in self.id_dict:
-            if inner and (id != "7" and id != "8"):
-                continue
-            if not inner and (id == "7" or id == "8"):
-                continue
-            self.id_stats_dict[id][1] = np.around(1.0*self.id_stats_dict[id][1] / self.id_stats_dict[id][0], 3)
-        
-        for k in self.lp_dict:
-            if ("7" in self.id_dict and "8" in self.id_dict):
-                if inner and (k not in self.id_dict["7"] and k not in self.id_dict["8"]):
-                    continue
-                if not inner and (k in self.id_dict["7"] or k in self.id_dict["8"]):
-                    continue
-
-            val = [1.0*arr / self.lp_dict[k][0] for arr in self.lp_dict[k][1]]
-            val = [np.around(v,decimals=3) for v in val]
-            self.lp_dict[k][1] = np.array(val)
-            flg = False
-
     def update_predictions(self, pred_id, pred_id_vec, pred_lp, pred_lp_vecs, inner=False):
-        """Updates prediction dictionaries for the plate ID and names.
+        """Updates the prediction store with the plate ID and name.
 
         Args:
             pred_id (str): the predicted license plate ID
@@ -440,36 +559,52 @@ class Driver:
             pred_lp_vecs (ndarray): s 2D numpy array, where each element is the predicited probabilties for the corresponding character
             inner (bool, optional): True if called when in the inner loop. Defaulted to False.
         """        
-        # id -> set[license plates]
         if not inner and (pred_id == "7" or pred_id =="8"):
             return
-        if not pred_id in self.id_dict:
-            self.id_dict[pred_id] = set()
-        self.id_dict[pred_id].add(pred_lp)
-        # id -> (freq, prediction vector)
-        if not pred_id in self.id_stats_dict:
-            self.id_stats_dict[pred_id] = [1,pred_id_vec]
-        else:
-            self.id_stats_dict[pred_id][0] += 1
-            self.id_stats_dict[pred_id][1] += pred_id_vec
-        # license plates -> (freq, prediction vector)
-        if not pred_lp in self.lp_dict:
-            self.lp_dict[pred_lp] = [1, pred_lp_vecs]
-        else:
-            self.lp_dict[pred_lp][0] += 1
-            self.lp_dict[pred_lp][1] += pred_lp_vecs
-            # self.lp_dict[pred_lp] = (freq, p_v)
+        self.plate_evidence.add(pred_id, pred_lp_vecs)
+        self.preds.add(pred_id, pred_id_vec, pred_lp, pred_lp_vecs)
+        if inner == (pred_id == "7" or pred_id == "8"):
+            # publishes as soon as the predictions of the ID are stable, for the plates of the current loop only
+            self.plate_pub.stream(pred_id, self.best_plate(pred_id))
+
+    def best_plate(self, plate_id):
+        """Best license plate of a plate ID, from the evidence that settled it if settled, otherwise from the
+        prediction counts (see is_plate_confident), so that it is always the plate that was judged stable.
+
+        Args:
+            plate_id (str): the plate ID
+
+        Returns:
+            str: the best license plate, None if never predicted
+        """
+        if self.plate_evidence.is_settled(plate_id):
+            return self.plate_evidence.best(plate_id)[0]
+        return self.preds.best(plate_id)
+
+    def is_plate_confident(self, plate_id):
+        """Determines whether or not the accumulated predictions for a plate ID are confident enough 
+        to skip reading it again (see PlateTracker).
+
+        Args:
+            plate_id (str): the plate ID
 
-    def is_straightened(self, img):
+        Returns:
+            bool: True if the predictions are confident, False otherwise.
+        """        
+        if self.plate_evidence.is_settled(plate_id):
+            return True
+        return self.preds.is_confident(plate_id, Driver.TRACK_MIN_ID_FREQ, Driver.TRACK_MIN_LP_FREQ, Driver.TRACK_MIN_LP_SHARE)
+
+    def is_straightened(self, ctx):
         """ Determines whether or not the robot is straightened to the red line
 
         Args:
-            img (cv::Mat): Raw image data
+            ctx (FrameContext): context of the raw image data
 
         Returns:
             int: -2 if error state, -1 if currently to the left, 0 if straight within thres, 1 if currently to the right
         """        
-        red_im = ImageProcessor.filter_red(img)
+        red_im = ctx.filter(ImageProcessor.red_low, ImageProcessor.red_up)
         edges = cv2.Canny(red_im,50,150,apertureSize = 3)
         minLineLength=100
         lines = cv2.HoughLinesP(image=edges,rho=1,theta=np.pi/180, threshold=100,lines=np.array([]), minLineLength=minLineLength,maxLineGap=80)
@@ -508,20 +643,24 @@ class Driver:
         """        
         print("------PRINTING STATS-------")
         print("IDS:")
-        for id in self.id_dict:
+        for id in self.preds.ids():
             print("----", id, "-----")
-            print(self.id_dict[id])
-            print(self.id_stats_dict[id])
-            print("MAX: ", np.amax(self.id_stats_dict[id][1]))
+            print(self.preds.candidates(id))
+            id_mean = np.around(self.preds.id_mean(id), 3)
+            print(self.preds.id_count(id), id_mean)
+            print("MAX: ", np.amax(id_mean))
         print("\n")
         print("LPS")
-        for k in self.lp_dict:
-            maxs = []
-            print("----", k, "-----")
-            print(self.lp_dict[k][0])
-            for c in self.lp_dict[k][1]:
-                maxs.append(np.amax(c))
-            print("MAXS: ", maxs)
+        for id in self.preds.ids():
+            # mean of the max probability of each character, per candidate
+            maxs = np.around(np.amax(self.preds.means(id), axis=2), 3)
+            for lp, freq, lp_maxs in zip(self.preds.candidates(id), self.preds.freqs(id), maxs):
+                print("----", id, lp, "-----")
+                print(freq)
+                print("MAXS: ", list(lp_maxs))
+        print("\n")
+        print("PLATE READS:", self.plate_tracker.reads, "SKIPPED:", self.plate_tracker.skips)
+        print("SETTLED:", {id: self.plate_evidence.best(id) for id in sorted(self.plate_evidence.settled)})
 
     def get_plate_results(self, inner=False):
         """Obtains the best predictions for each license plate ID.
@@ -530,18 +669,9 @@ class Driver:
         Returns:
             dict[str, str]: a dictionary where the key is the plate ID, and the value is the best license plate name for that ID.
         """        
-        combos = {}
-        for id in self.id_dict:
-            best_lp = None
-            best_lp_freqs = 0
-            for lp in self.id_dict[id]:
-                # highest freqs
-                if best_lp_freqs < self.lp_dict[lp][0]:
-                    best_lp_freqs = self.lp_dict[lp][0]
-                    best_lp = lp
-                combos[id] = best_lp
-
-        for id in self.id_dict:
+        combos = {id: self.best_plate(id) for id in self.preds.ids()}
+
+        for id in combos:
             if inner and (id != "7" and id != "8"):
                 continue
             elif not inner and (id == "7" or id == "8"):
@@ -553,53 +683,36 @@ class Driver:
 
         return combos
     def get_plate_results2(self, id, inner=False):
-        """Obtains the best predictions for each license plate ID.
+        """Obtains the best prediction for a license plate ID, and publishes it if it differs from the one already streamed.
         Args:
+            id (int): the plate ID
             inner (bool, optional): True if called when in the inner loop. Defaulted to False.
         Returns:
-            dict[str, str]: a dictionary where the key is the plate ID, and the value is the best license plate name for that ID.
+            bool: True if a message was published.
         """        
         id_str = str(id)
-        if id_str not in self.id_dict:
-            return
-        best_lp = None
-        best_lp_freqs = 0
-        for lp in self.id_dict[id_str]:
-            if best_lp_freqs < self.lp_dict[lp][0]:
-                # highest freqs
-                best_lp_freqs = self.lp_dict[lp][0]
-                best_lp = lp
-            elif best_lp_freqs == self.lp_dict[lp][0]:
-                # if tie, then get one with higher magnitude of max of all prediction vectors
-                maxs_curr_best = np.array([np.amax(v) for v in self.lp_dict[best_lp][1]])
-                maxs_lp = np.array([np.amax(v) for v in self.lp_dict[lp][1]])
-                if np.sum(maxs_curr_best**2) < np.sum(maxs_lp**2):
-                    best_lp_freqs = self.lp_dict[lp][0]
-                    best_lp = lp
-                else:
-                    best_lp_freqs = self.lp_dict[lp][0]
-                    best_lp = lp
-            self.results[id_str] = best_lp
+        best_lp = self.best_plate(id_str)
+        if best_lp is None:
+            return False
+        self.results[id_str] = best_lp
 
         if inner and (id_str != "7" and id_str != "8"):
-            return
+            return False
         elif not inner and (id_str == "7" or id_str == "8"):
-            return
-        print("--------------PUBLISHING--------------", id_str)
-        output_publish = String('TeamYoonifer,multi21,' + id_str + ',' + self.results[id_str])
-        self.license_pub.publish(output_publish)
+            return False
+        return self.plate_pub.publish(id_str, self.results[id_str])
 
-    def is_red_line_close(self, img):  
+    def is_red_line_close(self, ctx):  
         """Determines whether or not the robot is close to the red line.
 
         Args:
-            img (cv::Mat): The raw RGB image data to check if there is a red line
+            ctx (FrameContext): context of the raw RGB image data to check if there is a red line
 
         Returns:
             bool: True if deemed close to the red line, False otherwise.
         """        
-        red_filt = ImageProcessor.filter(img, ImageProcessor.red_low, ImageProcessor.red_up)
-        area = PlatePull.get_contours_area(red_filt,2)
+        with instrument.stage("red_line"):
+            area = ctx.contours_area(ImageProcessor.red_low, ImageProcessor.red_up, 2)
         if not list(area):
             return False
         if len(list(area)) == 1:
@@ -611,7 +724,7 @@ class Driver:
         red_filt = ImageProcessor.filter(img, ImageProcessor.red_low, ImageProcessor.red_up)
         return ImageProcessor.compare_frames(red_filt, np.zeros(red_filt.shape))
 
-    def can_cross_crosswalk(self, img): 
+    def can_cross_crosswalk(self, ctx): 
         """Determines whether or not the robot can drive past the crosswalk. Only to be called when 
         it is stopped in front of the red line. 
         Updates this object.
@@ -624,22 +737,19 @@ class Driver:
         - Robot must see the pedestrian to be in a stopped state.
 
         Args:
-            img (cv::Mat): Raw RGB iamge data
+            ctx (FrameContext): context of the raw RGB iamge data
 
         Returns:
             bool: True if the robot able to cross crosswalk, False otherwise
         """        
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        img_gray = ImageProcessor.crop(img_gray, 180, 720-180, 320, 1280-320)
-        cv2.imshow("Crosswalk view", img_gray)
-        cv2.waitKey(1)
-        if self.prev_mse_frame is None:
-            self.prev_mse_frame = img_gray
+        img_gray = ctx.gray(Driver.CROSSWALK_ROI)
+        if self.show_views:
+            cv2.imshow("Crosswalk view", img_gray)
+            cv2.waitKey(1)
+        mse = self.crosswalk_motion.update(img_gray)
+        if mse is None:
             return False
         
-        mse = ImageProcessor.compare_frames(self.prev_mse_frame, img_gray)
-        self.prev_mse_frame = img_gray
-        
         if self.first_stopped_frames_count <= int(Driver.FIRST_STOP_SECS*Driver.FPS):
             self.first_stopped_frames_count += 1
             return False
@@ -648,7 +758,7 @@ class Driver:
                 self.first_ped_stopped = True
                 return False
             if self.first_ped_moved and self.first_ped_stopped:
-                self.prev_mse_frame = None
+                self.crosswalk_motion.reset()
                 self.first_stopped_frames_count = 0
                 return True
         if mse > Driver.CROSSWALK_MSE_MOVING_THRES:
@@ -668,6 +778,7 @@ class Driver:
         elif (self.start_counter == 10): 
             print(self.start_counter)
             self.license_pub.publish(String('TeamYoonifer,multi21,0,AA00'))
+            startup.record("first publish (since import)", time.perf_counter() - IMPORT_START)
         else:
             if (self.start_counter < 20):
                 self.move.linear.x = 0.7
@@ -703,19 +814,17 @@ class Driver:
         self.twist_pub.publish(self.move)
         self.turning_seq_counter1 += 1
     
-    def turning_seq_area_based(self, cv_image):
+    def turning_seq_area_based(self, ctx):
         """
         Sequence to merge robot into the inner loop, when faced towards the inner loop at intersection.
         Stops turning left and considered facing by comparing the image's blue area as reference.
 
         Args:
-            cv_image (cv::Mat): Raw image data from gazebo
+            ctx (FrameContext): context of the raw image data from gazebo
         """        
         z = 1
         x = 0
-        crped = ImageProcessor.crop(cv_image, row_start=int(720/2.2))
-        blu_crped = ImageProcessor.filter_blue(crped)
-        largest_blu_area = ImageProcessor.contours_area(blu_crped)[0]
+        largest_blu_area = ctx.contours_area(ImageProcessor.blue_low, ImageProcessor.blue_up, roi=Driver.BLUE_TURN_ROI)[0]
         print("largest blue area", largest_blu_area)
         if largest_blu_area and largest_blu_area > Driver.BLUE_AREA_THRES_TURN:
             z = 0
@@ -749,12 +858,20 @@ class Driver:
         self.inner_counter += 1
         
 def main(args):    
+    startup.record("import driver modules", IMPORT_SECS)
     rospy.init_node('Driver', anonymous=True)
     dv = Driver()
     try:
         rospy.spin()
     except KeyboardInterrupt:
         ("Shutting down")
+    if dv.worker is not None:
+        dv.worker.stop()
+        dv.worker.print_stats()
+    if dv.plate_proc is not None:
+        print("plate frames dropped:", dv.plate_proc.dropped)
+        dv.plate_proc.close()
+    instrument.PROFILER.report()
     cv2.destroyAllWindows()
     print("end")
 
@@ -0,0 +1,217 @@
+import cv2
+import numpy as np
+
+from hsv_view import ImageProcessor
+import contour_analysis
+from color_lut import ColorClassifier
+
+
+class FrameContext:
+    """This class holds a single camera frame and everything derived from it.
+
+    The hsv conversion is done once per frame (or per region of interest if the whole frame is not needed,
+    see use_full_frame),
+    and every mask, blur and contour list is computed lazily on first use, then memoized by its threshold range
+    and region. Results are identical to the corresponding ImageProcessor functions, which should be used on
+    images that are not full frames. Contours are found with contour_analysis.
+
+    With a ColorClassifier whose table is ready, the masks of its classes are bit tests of a label image
+    of the region instead of range tests of the hsv image.
+    """
+
+    def __init__(self, img, type="bgr", classifier=None):
+        """Creates a FrameContext object for a new frame.
+
+        Args:
+            img (cv::Mat): raw image data from gazebo
+            type (str): (Optional) the channel type of the image data. Assumed to be "bgr"
+            classifier (ColorClassifier, optional): classifier of the colours of the masks. Defaults to None (hsv range tests).
+        """
+        self.img = img
+        self.type = type
+        self.classifier = classifier
+        self._hsv = None
+        self._full = False
+        self._memo = {}
+
+    def use_full_frame(self):
+        """Announces that the whole frame will be converted (e.g. plate extraction, red line) for this frame, 
+        so that regions of interest are cropped from the single whole frame conversion instead of being converted 
+        on their own beforehand.
+        """
+        self._full = True
+
+    @property
+    def hsv(self):
+        """cv::Mat: the frame converted to hsv, computed once."""
+        if self._hsv is None:
+            if self.type == "rgb":
+                self._hsv = cv2.cvtColor(self.img, cv2.COLOR_RGB2HSV)
+            else:
+                self._hsv = cv2.cvtColor(self.img, cv2.COLOR_BGR2HSV)
+        return self._hsv
+
+    def hsv_roi(self, roi=None):
+        """The frame converted to hsv, within a region of interest. Only the region is converted,
+        unless the whole frame has already been converted, or will be (see use_full_frame).
+
+        Args:
+            roi (tuple[int], optional): (row_start, row_end, col_start, col_end) of the region, -1 if no change 
+                (see ImageProcessor.crop). Defaults to None (whole frame).
+
+        Returns:
+            cv::Mat: the region in hsv
+        """
+        if roi is None:
+            return self.hsv
+        if self._hsv is not None or self._full:
+            return ImageProcessor.crop(self.hsv, *roi)
+        def compute():
+            crped = ImageProcessor.crop(self.img, *roi)
+            if self.type == "rgb":
+                return cv2.cvtColor(crped, cv2.COLOR_RGB2HSV)
+            return cv2.cvtColor(crped, cv2.COLOR_BGR2HSV)
+        return self._get(("hsv", roi), compute)
+
+    def labels(self, roi=None):
+        """The label image of the frame (see ColorClassifier.labels), within a region of interest. Only the region 
+        is classified, unless the whole frame has already been classified (same as hsv_roi).
+
+        Args:
+            roi (tuple[int], optional): region of interest, see hsv_roi. Defaults to None (whole frame).
+
+        Returns:
+            cv::Mat: the labels of the region
+        """
+        if roi is not None and (("labels", None) in self._memo or self._full):
+            return ImageProcessor.crop(self.labels(), *roi)
+        def compute():
+            crped = self.img if roi is None else ImageProcessor.crop(self.img, *roi)
+            return self.classifier.labels(crped, self.type)
+        return self._get(("labels", roi), compute)
+
+    def gray(self, roi=None):
+        """The grayscaled frame, within a region of interest. Only the region is converted.
+
+        Args:
+            roi (tuple[int], optional): (row_start, row_end, col_start, col_end) of the region, -1 if no change 
+                (see ImageProcessor.crop). Defaults to None (whole frame).
+
+        Returns:
+            cv::Mat: the grayscaled region
+        """
+        def compute():
+            crped = self.img if roi is None else ImageProcessor.crop(self.img, *roi)
+            if self.type == "rgb":
+                return cv2.cvtColor(crped, cv2.COLOR_RGB2GRAY)
+            return cv2.cvtColor(crped, cv2.COLOR_BGR2GRAY)
+        return self._get(("gray", roi), compute)
+
+    def _get(self, key, compute):
+        """Returns the memoized value of a key, computing it on the first call.
+
+        Args:
+            key (tuple): key of the derived value
+            compute (function): function without arguments computing the value
+
+        Returns:
+            any: the derived value
+        """
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def mask(self, hsv_low, hsv_up, roi=None):
+        """Binary mask of the pixels within an hsv range, without blur.
+
+        Args:
+            hsv_low (list[int]): a list of the lower bound of the hue, saturation, value
+            hsv_up (list[int]): a list of the upper bound of the hue, saturation, value
+            roi (tuple[int], optional): region of interest, see hsv_roi. Defaults to None (whole frame).
+
+        Returns:
+            cv::Mat: the binary image
+        """
+        key = ("mask", tuple(hsv_low), tuple(hsv_up), roi)
+        bit = None
+        if self.classifier is not None and self.classifier.ready(self.type):
+            bit = self.classifier.bit(hsv_low, hsv_up)
+        if bit is not None:
+            return self._get(key, lambda: ColorClassifier.mask(self.labels(roi), bit))
+        return self._get(key, lambda: cv2.inRange(self.hsv_roi(roi), np.array(hsv_low), np.array(hsv_up)))
+
+    def filter(self, hsv_low, hsv_up, roi=None):
+        """Same as ImageProcessor.filter, on the frame cropped to a region of interest.
+
+        Args:
+            hsv_low (list[int]): a list of the lower bound of the hue, saturation, value
+            hsv_up (list[int]): a list of the upper bound of the hue, saturation, value
+            roi (tuple[int], optional): region of interest, see hsv_roi. Defaults to None (whole frame).
+
+        Returns:
+            cv::Mat: the procesed image (binary image)
+        """
+        key = ("filter", tuple(hsv_low), tuple(hsv_up), roi)
+        return self._get(key, lambda: cv2.GaussianBlur(self.mask(hsv_low, hsv_up, roi), (3, 3), 0))
+
+    def filter_plate(self, hsv_low, hsv_up):
+        """Same as ImageProcessor.filter_plate.
+
+        Args:
+            hsv_low (list[int]): a list of the lower bound of the hue, saturation, value
+            hsv_up (list[int]): a list of the upper bound of the hue, saturation, value
+
+        Returns:
+            cv::Mat: the processed image containing the license plate.
+        """
+        def compute():
+            blur = cv2.GaussianBlur(self.mask(hsv_low, hsv_up), (5, 5), 0)
+            return cv2.erode(blur, (9, 9))
+        key = ("filter_plate", tuple(hsv_low), tuple(hsv_up))
+        return self._get(key, compute)
+
+    def contours(self, hsv_low, hsv_up, roi=None, plate=False, nums=None, min_area=0):
+        """Largest contours of a filtered image of the frame.
+
+        Args:
+            hsv_low (list[int]): a list of the lower bound of the hue, saturation, value
+            hsv_up (list[int]): a list of the upper bound of the hue, saturation, value
+            roi (tuple[int], optional): region of interest, see hsv_roi. Ignored for plates. Defaults to None (whole frame).
+            plate (bool, optional): True to use filter_plate instead of filter, and to include nested contours. Defaults to False.
+            nums (int, optional): max number of contours. Defaults to None (all).
+            min_area (float, optional): min contour area. Defaults to 0.
+
+        Returns:
+            tuple[list, list[float]]: the contours and their areas, sorted by area in descending order
+        """
+        def compute():
+            if plate:
+                img = self.filter_plate(hsv_low, hsv_up)
+            else:
+                img = self.filter(hsv_low, hsv_up, roi)
+            return contour_analysis.find(img, nested=plate)
+        key = ("contours", tuple(hsv_low), tuple(hsv_up), roi, plate)
+        contours, areas = self._get(key, compute)
+        return contour_analysis.top(contours, areas, nums, min_area)
+
+    def contours_area(self, hsv_low, hsv_up, nums=1, roi=None):
+        """Same as PlatePull.get_contours_area on a filtered image of the frame.
+
+        Args:
+            hsv_low (list[int]): a list of the lower bound of the hue, saturation, value
+            hsv_up (list[int]): a list of the upper bound of the hue, saturation, value
+            nums (int): number of top contour areas to obtain
+            roi (tuple[int], optional): region of interest, see hsv_roi. Defaults to None (whole frame).
+
+        Returns:
+            list(float): the top contour areas, sorted in descending order
+        """
+        return self.contours(hsv_low, hsv_up, roi, nums=nums)[1]
+
+    def component_areas(self, hsv_low, hsv_up, nums=1, roi=None):
+        """Same as contour_analysis.component_areas on a filtered image of the frame (see contours_area).
+
+        Returns:
+            list(float): the top component areas (pixel counts), sorted in descending order
+        """
+        return contour_analysis.component_areas(self.filter(hsv_low, hsv_up, roi), nums)
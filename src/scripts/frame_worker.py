@@ -0,0 +1,149 @@
+import threading
+import traceback
+
+
+class LatestFrameSlot:
+    """This class is a depth-1 "latest wins" slot between the image subscriber and a worker.
+
+    Putting a frame replaces the pending one, if it has not been taken yet. Frames are numbered
+    in arrival order, so the worker always sees them in order, with superseded ones skipped.
+    """
+
+    def __init__(self):
+        """Creates an empty LatestFrameSlot object.
+        """
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.received = 0
+        self.superseded = 0
+
+    def put(self, frame):
+        """Places a new frame in the slot, replacing the pending frame. Never blocks on the worker.
+
+        Args:
+            frame (any): the new frame (e.g. sensor_msgs::Image)
+        """
+        with self.cond:
+            if self.frame is not None:
+                self.superseded += 1
+            self.received += 1
+            self.seq += 1
+            self.frame = (self.seq, frame)
+            self.cond.notify()
+
+    def take(self, timeout=None):
+        """Takes the pending frame out of the slot, waiting for one if empty.
+
+        Args:
+            timeout (float, optional): max secs to wait for a frame. Defaults to None (waits forever).
+
+        Returns:
+            tuple[int, any]: the frame's sequence number and the frame, or None if timed out.
+        """
+        with self.cond:
+            if self.frame is None:
+                self.cond.wait(timeout)
+            item = self.frame
+            self.frame = None
+            return item
+
+
+class FrameWorker(threading.Thread):
+    """This class runs the frame processing in its own thread, on the latest frame of a LatestFrameSlot.
+    """
+    TIMEOUT_SECS = 0.5
+
+    def __init__(self, handler, name="frame_worker"):
+        """Creates a FrameWorker object. Call start() to start processing.
+
+        Args:
+            handler (function): function called with every frame taken, in order
+            name (str, optional): name of the thread. Defaults to "frame_worker".
+        """
+        super().__init__(name=name, daemon=True)
+        self.handler = handler
+        self.slot = LatestFrameSlot()
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.errors = 0
+        self.last_seq = 0
+
+    def submit(self, frame):
+        """Submits a new frame to be processed. Meant to be called from the subscriber callback.
+
+        Args:
+            frame (any): the new frame
+        """
+        self.slot.put(frame)
+
+    def run(self):
+        """Processes frames until stopped. An error in the handler only loses its frame: it is logged and counted,
+        and the worker goes on with the next frame.
+        """
+        while not self.stop_event.is_set():
+            item = self.slot.take(FrameWorker.TIMEOUT_SECS)
+            if item is None:
+                continue
+            seq, frame = item
+            if seq <= self.last_seq:
+                # never processes an older frame after a newer one
+                continue
+            self.last_seq = seq
+            try:
+                self.handler(frame)
+            except Exception:
+                self.errors += 1
+                print("frame", seq, "failed:")
+                traceback.print_exc()
+                continue
+            self.processed += 1
+
+    def stop(self):
+        """Stops processing after the current frame.
+        """
+        self.stop_event.set()
+
+    def stats(self):
+        """Statistics of the frames submitted to this worker.
+
+        Returns:
+            dict[str, int]: number of frames received, processed, failed (the handler raised) and superseded
+            (dropped before being processed)
+        """
+        with self.slot.cond:
+            return {
+                "received": self.slot.received,
+                "processed": self.processed,
+                "errors": self.errors,
+                "superseded": self.slot.superseded
+            }
+
+    def print_stats(self):
+        """Prints the statistics of the frames submitted to this worker.
+        """
+        print("------FRAME WORKER-------")
+        print(self.stats())
+
+
+if __name__ == '__main__':
+    # regression check: a frame whose handler raises must not stop the worker
+    handled = []
+    done = threading.Event()
+
+    def handler(frame):
+        if frame == "bad":
+            raise ValueError("bad frame")
+        handled.append(frame)
+        done.set()
+
+    worker = FrameWorker(handler)
+    worker.start()
+    worker.submit("bad")
+    while worker.stats()["errors"] == 0:
+        worker.stop_event.wait(0.01)
+    worker.submit("good")
+    assert done.wait(5), "worker stopped after a handler error"
+    assert worker.is_alive() and handled == ["good"], worker.stats()
+    worker.stop()
+    worker.print_stats()
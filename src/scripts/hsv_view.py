@@ -11,7 +11,8 @@ import time
 import numpy as np
 from sensor_msgs.msg import Image
 from cv_bridge import CvBridge, CvBridgeError
-from skimage.metrics import mean_squared_error
+from ros_image import imgmsg_to_bgr
+import contour_analysis
 
 class ImageProcessor:
     """This class handles any image processing-related needs.
@@ -86,7 +87,8 @@ class ImageProcessor:
         Returns:
             float: the error between the images
         """        
-        return mean_squared_error(bin_img1, bin_img2)
+        diff = np.asarray(bin_img1, dtype=np.float64) - np.asarray(bin_img2, dtype=np.float64)
+        return np.mean(np.square(diff))
 
     @staticmethod
     def crop(img, row_start=-1, row_end=-1, col_start=-1, col_end=-1):
@@ -142,19 +144,13 @@ class ImageProcessor:
             data (sensor_msgs::Image): image data from the /R1/.../image_raw ros topic
         """        
         try:
-            cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+            cv_image = imgmsg_to_bgr(data)
         except CvBridgeError as e:
             print(e)
         self.truck_test(cv_image)
 
     def contours_area(img,nums=1):
-        contours, hierarchy = cv2.findContours(
-            image=img, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE)
-        cs = sorted(contours, key=cv2.contourArea, reverse=True)
-        if len(cs) > nums:
-            cs = cs[:nums]
-        areas = [cv2.contourArea(c) for c in cs] 
-        return areas
+        return contour_analysis.top_areas(img, nums)
     
     def blue_area(self, cv_image):
         crped = ImageProcessor.crop(cv_image, row_start=int(720/2.2))
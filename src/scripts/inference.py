@@ -0,0 +1,181 @@
+import os
+import sys
+import numpy as np
+from startup import timed
+
+"""Inference backends, chosen by name:
+keras    - model.predict, the reference
+function - tf.function compiled direct call of the model
+tflite   - model converted to TFLite, ran on the cpu interpreter
+"""
+BACKENDS = ('keras', 'function', 'tflite')
+DEFAULT_BACKEND = os.environ.get('INFERENCE_BACKEND', 'function')
+VERIFY_ATOL = 1e-4
+INPUT_BATCH = 8  # initial batch capacity of an InputBuffer
+
+
+def import_tensorflow():
+    """Imports tensorflow, recording the time of the first import. Tensorflow is only imported
+    when the first model is loaded, so that importing the nodes is fast.
+
+    Returns:
+        module: the tensorflow module
+    """
+    if 'tensorflow' not in sys.modules:
+        with timed("import tensorflow"):
+            import tensorflow
+    import tensorflow as tf
+    return tf
+
+
+class KerasBackend:
+    """Runs inference through keras' model.predict (reference backend).
+    """
+
+    def __init__(self, model):
+        """Creates a KerasBackend object.
+
+        Args:
+            model (keras.Model): loaded keras model
+        """
+        self.model = model
+
+    def __call__(self, batch):
+        """Predicts on a batch of inputs.
+
+        Args:
+            batch (ndarray): normalized inputs, with the batch as the first dimension
+
+        Returns:
+            ndarray: the predictions, one row per input
+        """
+        return self.model.predict(batch)
+
+
+class FunctionBackend(KerasBackend):
+    """Runs inference by calling the model directly inside a compiled tf.function,
+    skipping the per call data pipeline setup of model.predict.
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        tf = import_tensorflow()
+        spec = tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)
+        self.fn = tf.function(lambda x: model(x, training=False), input_signature=[spec])
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.fn(batch).numpy()
+
+
+class TFLiteBackend(KerasBackend):
+    """Runs inference with the TFLite interpreter on a converted copy of the model.
+    """
+
+    def __init__(self, model):
+        super().__init__(model)
+        tf = import_tensorflow()
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        self.interpreter = tf.lite.Interpreter(model_content=converter.convert())
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.batch_size = 1
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.shape[0] != self.batch_size:
+            # interpreter tensors have a fixed shape, only resized when the batch size changes
+            self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch.shape[0]
+        self.interpreter.set_tensor(self.input_index, batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class InputBuffer:
+    """This class is the preallocated float32 input batch of a model, of shape (N, H, W, 1), filled in place 
+    with normalized images instead of allocating new arrays (and a float64 round trip) on every prediction.
+
+    The batch returned by fill is a view of the buffer, only valid until the next fill: a buffer must not be 
+    shared between threads.
+    """
+
+    def __init__(self, shape, batch=INPUT_BATCH):
+        """Creates an InputBuffer object.
+
+        Args:
+            shape (tuple[int]): shape of a single input, (H, W, 1) (e.g. model.input_shape[1:])
+            batch (int, optional): initial batch capacity, doubled when exceeded. Defaults to INPUT_BATCH.
+        """
+        self.shape = tuple(shape)
+        self.buf = np.empty((batch,) + self.shape, dtype=np.float32)
+
+    def fill(self, imgs, scale=1.0/255):
+        """Writes normalized images into the buffer.
+
+        Args:
+            imgs (list[cv::Mat]): 2D images of shape (H, W)
+            scale (float, optional): normalization factor. Defaults to 1/255.
+
+        Returns:
+            ndarray: the batch of inputs, of shape (len(imgs), H, W, 1)
+        """
+        n = len(imgs)
+        if n > self.buf.shape[0]:
+            self.buf = np.empty((max(n, 2*self.buf.shape[0]),) + self.shape, dtype=np.float32)
+        scale = np.float32(scale)
+        for i, img in enumerate(imgs):
+            np.multiply(img, scale, out=self.buf[i].reshape(img.shape), dtype=np.float32)
+        return self.buf[:n]
+
+
+BACKEND_TYPES = {
+    'keras': KerasBackend,
+    'function': FunctionBackend,
+    'tflite': TFLiteBackend
+}
+
+
+def verify_backend(backend, atol=VERIFY_ATOL):
+    """Checks the outputs of a backend against the keras reference, on a random input.
+
+    Args:
+        backend (KerasBackend): backend to be checked
+        atol (float, optional): max absolute difference allowed. Defaults to VERIFY_ATOL.
+
+    Raises:
+        ValueError: If the outputs differ from the keras reference.
+    """
+    sample = np.random.rand(*((2,) + tuple(backend.model.input_shape[1:]))).astype(np.float32)
+    ref = backend.model.predict(sample)
+    out = backend(sample)
+    if not np.allclose(ref, out, atol=atol):
+        raise ValueError(f"{type(backend).__name__} outputs differ from keras - max diff={np.amax(np.abs(ref - out))}")
+
+
+def load_backend(path, backend=None, verify=True):
+    """Loads a trained model and wraps it into an inference backend.
+
+    Args:
+        path (str): path where the trained model is saved.
+        backend (str, optional): name of the backend, one of BACKENDS. Defaults to DEFAULT_BACKEND.
+        verify (bool, optional): True to check the backend outputs against keras. Defaults to True.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+
+    Returns:
+        KerasBackend: the backend, callable on a batch of inputs
+    """
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if backend not in BACKEND_TYPES:
+        raise ValueError(f"Unknown inference backend: {backend}, expected one of {BACKENDS}")
+    tf = import_tensorflow()
+    with timed("load " + os.path.basename(path)):
+        infer = BACKEND_TYPES[backend](tf.keras.models.load_model(path))
+        if verify and backend != 'keras':
+            verify_backend(infer)
+    return infer
@@ -0,0 +1,175 @@
+import math
+import time
+import json
+
+"""Per-stage latency instrumentation of the perception loop.
+
+Stages are timed with the monotonic perf_counter_ns clock, and recorded into fixed-size log-scale
+histograms (constant time and memory per sample), cheap enough to always be enabled:
+
+    with instrument.stage("drive_cnn"):
+        ...
+
+instrument.PROFILER.report() prints the percentiles of every stage.
+"""
+ENABLED = True
+
+MIN_NS = 1000  # 1 us, lower bound of the first bucket
+BUCKETS_PER_OCTAVE = 8  # ~9% bucket width
+NUM_BUCKETS = 27*BUCKETS_PER_OCTAVE  # up to ~2 min
+
+
+class StageHistogram:
+    """This class is a log-scale latency histogram of a single stage.
+    """
+
+    def __init__(self):
+        self.counts = [0]*NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        """Records a single latency sample.
+
+        Args:
+            ns (int): latency in nanoseconds
+        """
+        i = 0
+        if ns > MIN_NS:
+            i = min(int(math.log2(ns / MIN_NS)*BUCKETS_PER_OCTAVE), NUM_BUCKETS - 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, q):
+        """Approximates a latency percentile, as the upper bound of the bucket containing it.
+
+        Args:
+            q (float): percentile, in [0, 100]
+
+        Returns:
+            float: the latency percentile in milliseconds, 0 if there are no samples
+        """
+        if not self.count:
+            return 0
+        rank = q / 100.0*self.count
+        cum = 0
+        for i, c in enumerate(self.counts):
+            cum += c
+            if cum >= rank and c:
+                upper_ns = MIN_NS*2**((i + 1) / BUCKETS_PER_OCTAVE)
+                return min(upper_ns, self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def summary(self):
+        """Summary of the recorded samples.
+
+        Returns:
+            dict: count, then mean, p50, p95, p99 and max latencies in milliseconds
+        """
+        return {
+            "count": self.count,
+            "mean": self.total_ns / self.count / 1e6 if self.count else 0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max_ns / 1e6
+        }
+
+
+class Stage:
+    """Context manager timing its block into a StageHistogram.
+    """
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class NullStage:
+    """Context manager doing nothing, used when the instrumentation is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Profiler:
+    """This class holds the histograms of every stage, by name, in the order they were first timed.
+    """
+
+    def __init__(self):
+        self.hists = {}
+
+    def hist(self, name):
+        """Obtains the histogram of a stage, creating it if needed.
+
+        Args:
+            name (str): name of the stage
+
+        Returns:
+            StageHistogram: the histogram of the stage
+        """
+        h = self.hists.get(name)
+        if h is None:
+            h = self.hists[name] = StageHistogram()
+        return h
+
+    def stage(self, name):
+        """Context manager timing a stage.
+
+        Args:
+            name (str): name of the stage
+
+        Returns:
+            Stage: the context manager
+        """
+        if not ENABLED:
+            return NULL_STAGE
+        return Stage(self.hist(name))
+
+    def summary(self):
+        """Summary of every stage.
+
+        Returns:
+            dict[str, dict]: the summary of each stage (see StageHistogram.summary)
+        """
+        return {name: h.summary() for name, h in list(self.hists.items())}
+
+    def to_json(self):
+        """str: the summary of every stage, as json (e.g. for a diagnostics topic)."""
+        return json.dumps(self.summary())
+
+    def report(self):
+        """Prints the summary of every stage.
+        """
+        print("------STAGE LATENCIES (ms)-------")
+        print("{:<16} {:>7} {:>8} {:>8} {:>8} {:>8} {:>8}".format("stage", "count", "mean", "p50", "p95", "p99", "max"))
+        for name, s in self.summary().items():
+            print("{:<16} {:>7} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.3f}".format(
+                name, s["count"], s["mean"], s["p50"], s["p95"], s["p99"], s["max"]))
+
+
+PROFILER = Profiler()
+
+
+def stage(name):
+    """Context manager timing a stage with the process wide profiler (see Profiler.stage)."""
+    return PROFILER.stage(name)
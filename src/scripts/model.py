@@ -1,7 +1,5 @@
-import tensorflow as tf
-from tensorflow.keras import models
-import numpy as np
 from PIL import Image
+from inference import load_backend, InputBuffer
 
 class Model:
     """This class is responsble for handling trained models.
@@ -11,29 +9,18 @@ class Model:
     if the image has been saved as 2D. Resaving an image that has been opened with cv2 will expand the image dimensions, even if it
     is loaded again with PIL
     """
-    def __init__(self, path) -> None:
+    def __init__(self, path, backend=None) -> None:
         """Creates a Model object, representing a trained cnn that can be used.
 
         Args:
             path (str): path where the trained model is saved. 
+            backend (str, optional): name of the inference backend (see inference.BACKENDS). Defaults to inference.DEFAULT_BACKEND.
         """         
-        self.mod = models.load_model(path)
-        print(type(self.mod))
+        self.infer = load_backend(path, backend)
+        self.mod = self.infer.model
+        self.inputs = InputBuffer(self.mod.input_shape[1:], batch=1)
+        print(type(self.mod), type(self.infer))
     
-    @staticmethod
-    def preprcocess_img(img):
-        """Processes the input image to a format that can be compared with the cnn.
-
-        Args:
-            img (cv::Mat): input image
-
-        Returns:
-            cv::Mat: processed image
-        """        
-        img = img / 255
-        img = np.expand_dims(np.expand_dims(img,axis=-1),axis=0)
-        return img
-
     def predict(self, img):
         """Predicts what the robot's velocities should be based on the input image.
         Args:
@@ -42,6 +29,5 @@ class Model:
         Returns:
             np.array: A 1-D array containing the model's predictions
         """        
-        img = Model.preprcocess_img(img)
-        pred = self.mod.predict(img)[0]
+        pred = self.infer(self.inputs.fill([img]))[0]
         return pred
\ No newline at end of file
@@ -0,0 +1,89 @@
+import threading
+
+from inference import import_tensorflow
+from model import Model
+from char_reader import CharReader
+
+INTRA_OP_THREADS = 2
+INTER_OP_THREADS = 1
+
+
+class ModelServer:
+    """This class is the registry of the trained models used by a process.
+
+    Every model is loaded once, whichever object asks for it, and all of them run on the same tensorflow
+    runtime, whose thread pools are pinned to a fixed number of threads. Use get_server() to obtain the
+    server of the process.
+    """
+
+    def __init__(self, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        """Creates a ModelServer object. Does not load anything.
+
+        Args:
+            intra_op_threads (int, optional): threads used within an op. Defaults to INTRA_OP_THREADS.
+            inter_op_threads (int, optional): threads used to run independent ops. Defaults to INTER_OP_THREADS.
+        """
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.lock = threading.RLock()
+        self.configured = False
+        self.models = {}
+
+    def configure(self):
+        """Imports tensorflow and pins its thread pools. Only has an effect on the first call,
+        which should happen before any model is loaded.
+        """
+        with self.lock:
+            if self.configured:
+                return
+            tf = import_tensorflow()
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+            except RuntimeError as e:
+                # runtime already initialized by a model loaded outside of the server
+                print(e)
+            self.configured = True
+
+    def get(self, kind, path, backend=None):
+        """Obtains a model, loading it on the first request.
+
+        Args:
+            kind (type): Model or CharReader
+            path (str): path where the trained model is saved.
+            backend (str, optional): name of the inference backend (see inference.BACKENDS). Defaults to inference.DEFAULT_BACKEND.
+
+        Returns:
+            Model or CharReader: the shared model
+        """
+        key = (kind.__name__, path, backend)
+        with self.lock:
+            if key not in self.models:
+                self.configure()
+                self.models[key] = kind(path, backend)
+            return self.models[key]
+
+    def model(self, path, backend=None):
+        """Obtains a drive Model (see get)."""
+        return self.get(Model, path, backend)
+
+    def char_reader(self, path, backend=None):
+        """Obtains a CharReader (see get)."""
+        return self.get(CharReader, path, backend)
+
+
+SERVER = None
+SERVER_LOCK = threading.Lock()
+
+
+def get_server():
+    """Obtains the ModelServer of this process, creating it on the first call.
+
+    Returns:
+        ModelServer: the model server
+    """
+    global SERVER
+    with SERVER_LOCK:
+        if SERVER is None:
+            SERVER = ModelServer()
+        return SERVER
@@ -0,0 +1,75 @@
+from collections import deque
+import cv2
+import numpy as np
+
+
+class MotionDetector:
+    """This class detects motion between consecutive grayscaled frames of a fixed view (e.g. pedestrian, truck).
+
+    Frames are compared in uint8/uint32 integer arithmetic. At full resolution the scores are the same as
+    ImageProcessor.compare_frames, so the same thresholds apply. Downsampling averages out the fine differences
+    of textured motion (down to a third of the full resolution score at 0.5), so it needs its own thresholds.
+    The recent frames and scores are kept in ring buffers for windowed statistics.
+    """
+    DOWNSAMPLE = 1.0
+    WINDOW = 5
+
+    def __init__(self, downsample=DOWNSAMPLE, window=WINDOW):
+        """Creates a MotionDetector object, without any frame.
+
+        Args:
+            downsample (float, optional): ratio to downsample the frames (<= 1), see above. Defaults to DOWNSAMPLE (none).
+            window (int, optional): number of recent frames and scores kept. Defaults to WINDOW.
+        """
+        self.downsample = downsample
+        self.frames = deque(maxlen=window)
+        self.scores = deque(maxlen=window)
+        self.diff = None
+
+    def reset(self):
+        """Forgets all frames and scores (i.e. the next frame is the first one).
+        """
+        self.frames.clear()
+        self.scores.clear()
+        self.diff = None
+
+    def update(self, img_gray):
+        """Adds a new frame and scores it against the previous one.
+
+        Args:
+            img_gray (cv::Mat): grayscaled frame, of the same size as the previous ones
+
+        Returns:
+            float: the mean squared error with the previous frame, or None if it is the first frame
+        """
+        if self.downsample < 1:
+            img_gray = cv2.resize(img_gray, (0, 0), fx=self.downsample, fy=self.downsample, interpolation=cv2.INTER_AREA)
+        mse = None
+        if self.frames:
+            self.diff = cv2.absdiff(self.frames[-1], img_gray)
+            mse = int(np.sum(np.square(self.diff, dtype=np.uint32), dtype=np.uint64)) / self.diff.size
+            self.scores.append(mse)
+        self.frames.append(img_gray)
+        return mse
+
+    def mse(self):
+        """float: the latest mean squared error, or None if there is none."""
+        return self.scores[-1] if self.scores else None
+
+    def abs_diff(self):
+        """float: the latest mean absolute difference, or None if there is none."""
+        if self.diff is None:
+            return None
+        return int(np.sum(self.diff, dtype=np.uint64)) / self.diff.size
+
+    def window_mse(self):
+        """float: the mean of the scores within the window, or None if there is none."""
+        if not self.scores:
+            return None
+        return sum(self.scores) / len(self.scores)
+
+    def window_max_mse(self):
+        """float: the max of the scores within the window, or None if there is none."""
+        if not self.scores:
+            return None
+        return max(self.scores)
@@ -0,0 +1,109 @@
+import numpy as np
+
+from char_reader import CharReader
+
+
+class PlateEvidence:
+    """This class accumulates the character predictions of every plate ID as log probabilities, online.
+
+    The posterior of each character is the normalized product of its predicted probabilities. Consecutive frames 
+    of the same plate are far from independent (same view, same mistakes), so every observation only counts for 
+    obs_weight of an independent one, and a prediction (nearly) identical to the previous one of the ID, e.g. 
+    while stopped, is not a new observation at all. An ID is settled once the posterior of its best license plate 
+    reaches the settle probability, and it then does not need to be read again.
+    """
+    SETTLE_PROB = 0.99
+    MIN_OBS = 5
+    OBS_WEIGHT = 0.5
+    SAME_VIEW_TOL = 0.01
+    EPS = 1e-6
+
+    def __init__(self, settle_prob=SETTLE_PROB, min_obs=MIN_OBS, obs_weight=OBS_WEIGHT):
+        """Creates a PlateEvidence object, without any observation.
+
+        Args:
+            settle_prob (float, optional): posterior of the best plate above which an ID is settled. Defaults to SETTLE_PROB.
+            min_obs (int, optional): min number of distinct observations before an ID can be settled. Defaults to MIN_OBS.
+            obs_weight (float, optional): weight of the log probabilities of every observation. Defaults to OBS_WEIGHT.
+        """
+        self.settle_prob = settle_prob
+        self.min_obs = min_obs
+        self.obs_weight = obs_weight
+        self.log_probs = {}
+        self.num_obs = {}
+        self.last_vecs = {}
+        self.settled = set()
+
+    def add(self, plate_id, pred_lp_vecs):
+        """Adds an observation of a plate.
+
+        Args:
+            plate_id (str): the predicted plate ID
+            pred_lp_vecs (list[array]): the predicted probabilities of each character, of different sizes (see PlateReader.characters)
+        """
+        # one vector per character, of the size of its model's classes (e.g. 26 letters, 10 numbers)
+        vecs = [np.asarray(vec, dtype=np.float64) for vec in pred_lp_vecs]
+        last = self.last_vecs.get(plate_id)
+        if (last is not None and [v.shape for v in last] == [v.shape for v in vecs]
+                and max(np.amax(np.abs(a - b)) for a, b in zip(last, vecs)) < PlateEvidence.SAME_VIEW_TOL):
+            # same view as the previous observation, no new evidence
+            return
+        self.last_vecs[plate_id] = vecs
+        log_vecs = [self.obs_weight*np.log(vec + PlateEvidence.EPS) for vec in vecs]
+        if plate_id not in self.log_probs:
+            self.log_probs[plate_id] = log_vecs
+            self.num_obs[plate_id] = 1
+        else:
+            for acc, log_vec in zip(self.log_probs[plate_id], log_vecs):
+                acc += log_vec
+            self.num_obs[plate_id] += 1
+        if self.num_obs[plate_id] >= self.min_obs and self.best_prob(plate_id) >= self.settle_prob:
+            if plate_id not in self.settled:
+                print("--------------SETTLED--------------", plate_id, self.best(plate_id))
+            self.settled.add(plate_id)
+
+    def posteriors(self, plate_id):
+        """Posterior probabilities of each character of a plate.
+
+        Args:
+            plate_id (str): the plate ID
+
+        Returns:
+            list[ndarray]: the posterior probabilities of each character
+        """
+        out = []
+        for acc in self.log_probs[plate_id]:
+            p = np.exp(acc - np.amax(acc))
+            out.append(p / np.sum(p))
+        return out
+
+    def best(self, plate_id):
+        """Best license plate of a plate ID and its posterior probability.
+
+        Args:
+            plate_id (str): the plate ID
+
+        Returns:
+            tuple[str, float]: the best license plate, and its posterior probability. ("", 0) if the ID was never observed.
+        """
+        if plate_id not in self.log_probs:
+            return "", 0
+        lp = ''.join(CharReader.interpret(p) for p in self.posteriors(plate_id))
+        return lp, self.best_prob(plate_id)
+
+    def best_prob(self, plate_id):
+        """Posterior probability of the best license plate of a plate ID.
+
+        Args:
+            plate_id (str): the plate ID
+
+        Returns:
+            float: the posterior probability, 0 if the ID was never observed.
+        """
+        if plate_id not in self.log_probs:
+            return 0
+        return float(np.prod([np.amax(p) for p in self.posteriors(plate_id)]))
+
+    def is_settled(self, plate_id):
+        """bool: True if the plate ID is settled."""
+        return plate_id in self.settled
@@ -0,0 +1,171 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import traceback
+import numpy as np
+
+FRAME_SHAPE = (720, 1280, 3)
+FRAME_DTYPE = np.uint8
+
+
+def plate_worker(shm_name, requests, results, lut_masks=True):
+    """Entry point of the plate recognition process. Loads its own PlateReader models and reads plates
+    from the frames written to shared memory, until a None request is received.
+    A frame that fails to be read is logged and answered with no plate.
+
+    Args:
+        shm_name (str): name of the shared memory block holding the frame
+        requests (multiprocessing.Queue): requests of (seq, type, read_lp, inner) for the frame in shared memory
+        results (multiprocessing.Queue): results of (seq, inner, plates), plates being the prediction data of every plate read
+            (see PlateReader.read_plates)
+        lut_masks (bool, optional): True to build the colour masks with a ColorClassifier. Defaults to True.
+    """
+    # imported here so that only the plate process loads the character models
+    from plate_reader import PlateReader
+    from frame_context import FrameContext
+    from color_lut import ColorClassifier
+
+    pr = PlateReader(script_run=False)
+    classifier = None
+    if lut_masks:
+        classifier = ColorClassifier()
+        # built before the first frame is read, not while reading it
+        classifier.prepare()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray(FRAME_SHAPE, dtype=FRAME_DTYPE, buffer=shm.buf)
+    try:
+        while True:
+            req = requests.get()
+            if req is None:
+                break
+            seq, type, read_lp, inner = req
+            ctx = FrameContext(frame, type, classifier)
+            try:
+                plates = pr.read_plates(frame, ctx, read_lp=read_lp)
+            except Exception:
+                print("plate process: frame", seq, "failed:")
+                traceback.print_exc()
+                plates = []
+            results.put((seq, inner, plates))
+    finally:
+        del frame
+        shm.close()
+
+
+class PlateProcess:
+    """This class runs plate recognition in a separate process, so that it does not share a core (or the GIL) with driving.
+
+    Frames are passed through shared memory, one at a time: a frame submitted while the previous one
+    is still being read is dropped. A process that died is restarted, up to MAX_RESTARTS times, after which
+    the PlateProcess has failed and the plates must be read elsewhere.
+    """
+    MAX_RESTARTS = 2
+
+    def __init__(self, lut_masks=True):
+        """Creates a PlateProcess object and starts the plate recognition process.
+
+        Args:
+            lut_masks (bool, optional): True to build the colour masks with a ColorClassifier (see Driver.LUT_MASKS).
+                Defaults to True.
+        """
+        self.ctx = mp.get_context("spawn")
+        self.lut_masks = lut_masks
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(FRAME_SHAPE)))
+        self.frame = np.ndarray(FRAME_SHAPE, dtype=FRAME_DTYPE, buffer=self.shm.buf)
+        self.seq = 0
+        self.dropped = 0
+        self.restarts = 0
+        self.failed = False
+        self.start()
+
+    def start(self):
+        """Starts a plate recognition process, with new queues.
+        """
+        self.requests = self.ctx.Queue(maxsize=1)
+        self.results = self.ctx.Queue()
+        self.proc = self.ctx.Process(target=plate_worker, args=(self.shm.name, self.requests, self.results, self.lut_masks),
+                                     name="plate_process", daemon=True)
+        self.proc.start()
+        self.busy = False
+
+    def check_alive(self):
+        """Restarts the plate recognition process if it died, the frame being read (if any) being lost.
+
+        Returns:
+            bool: True if the process is running, False if it has failed too many times.
+        """
+        if self.failed:
+            return False
+        if self.proc.is_alive():
+            return True
+        print("plate process died (exit code {}), frame {} lost".format(self.proc.exitcode, self.seq if self.busy else None))
+        if self.restarts >= PlateProcess.MAX_RESTARTS:
+            print("plate process failed", self.restarts + 1, "times, not restarted")
+            self.failed = True
+            return False
+        self.restarts += 1
+        print("restarting plate process", self.restarts, "/", PlateProcess.MAX_RESTARTS)
+        self.start()
+        return True
+
+    def submit(self, img, type="bgr", read_lp=True, inner=False):
+        """Submits a frame to be read, unless the previous frame is still being read.
+
+        Args:
+            img (cv::Mat): Raw image data containing a license plate to predict on
+            type (str): (Optional) the channel type of the image data. Assumed to be "bgr"
+            read_lp (bool, optional): False to skip the license plate prediction. Defaults to True.
+            inner (bool, optional): True if submitted when in the inner loop. Defaulted to False.
+
+        Raises:
+            ValueError: If the image does not have the shape of a camera frame.
+
+        Returns:
+            bool: True if the frame was submitted, False if dropped (or if the process has failed).
+        """
+        if img.shape != FRAME_SHAPE:
+            raise ValueError(f"Frame shape {img.shape} does not match {FRAME_SHAPE}")
+        if not self.check_alive():
+            self.dropped += 1
+            return False
+        if self.busy:
+            self.dropped += 1
+            return False
+        np.copyto(self.frame, img)
+        self.seq += 1
+        self.busy = True
+        self.requests.put((self.seq, type, read_lp, inner))
+        return True
+
+    def poll(self):
+        """Obtains the results read since the last call, without blocking.
+
+        Returns:
+            list[tuple]: results of (seq, inner, plates), in order (see plate_worker)
+        """
+        out = []
+        while True:
+            try:
+                out.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        if out:
+            self.busy = False
+        else:
+            self.check_alive()
+        return out
+
+    def close(self):
+        """Stops the plate recognition process and releases the shared memory.
+        """
+        try:
+            if self.proc.is_alive():
+                self.requests.put(None, timeout=5)
+                self.proc.join(timeout=5)
+        except queue.Full:
+            pass
+        if self.proc.is_alive():
+            self.proc.terminate()
+        del self.frame
+        self.shm.close()
+        self.shm.unlink()
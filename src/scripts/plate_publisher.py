@@ -0,0 +1,55 @@
+from std_msgs.msg import String
+
+TEAM = 'TeamYoonifer,multi21'
+
+
+class PlatePublisher:
+    """This class publishes the license plate of every plate ID to the score tracker as soon as its predictions are stable,
+    instead of waiting for the end of a loop.
+
+    A plate is only published again if its best license plate changes.
+    """
+
+    def __init__(self, license_pub, is_stable, team=TEAM):
+        """Creates a PlatePublisher object, without any prediction.
+
+        Args:
+            license_pub (rospy.Publisher): publisher of the plates
+            is_stable (function): function of a plate ID, True if its predictions are stable enough to be published
+            team (str, optional): team name and password prefixing every message. Defaults to TEAM.
+        """
+        self.license_pub = license_pub
+        self.is_stable = is_stable
+        self.team = team
+        self.published = {}  # id -> last published license plate
+
+    def stream(self, plate_id, lp):
+        """Publishes the best license plate of an ID if its predictions are stable.
+
+        Args:
+            plate_id (str): the plate ID
+            lp (str): its best license plate (see PredictionStore.best)
+
+        Returns:
+            bool: True if a message was published.
+        """
+        if not self.is_stable(plate_id):
+            return False
+        return self.publish(plate_id, lp)
+
+    def publish(self, plate_id, lp):
+        """Publishes the license plate of an ID, unless it was already published.
+
+        Args:
+            plate_id (str): the plate ID
+            lp (str): its license plate
+
+        Returns:
+            bool: True if a message was published, False if unchanged.
+        """
+        if not lp or self.published.get(plate_id) == lp:
+            return False
+        print("--------------PUBLISHING--------------", plate_id, lp)
+        self.license_pub.publish(String(self.team + ',' + plate_id + ',' + lp))
+        self.published[plate_id] = lp
+        return True
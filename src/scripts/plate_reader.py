@@ -11,8 +11,14 @@ import random
 import numpy as np
 from sensor_msgs.msg import Image
 from cv_bridge import CvBridge, CvBridgeError
+from ros_image import imgmsg_to_bgr
 from char_reader import CharReader
 from hsv_view import ImageProcessor
+from quad import order_corners
+from plate_rectifier import PlateRectifier
+from model_server import get_server
+import instrument
+import contour_analysis
 
 # license plate working values
 
@@ -20,7 +26,9 @@ CAR_WIDTH = 200
 CAR_HEIGHT = 320
 PLATE_F = 270
 PLATE_I = 220
-PLATE_RES = (150, 298)
+PLATE_RES = (150, 298)  # resolution the character and ID crops are resized to first, as in training
+CHAR_RES = (15, 29)  # resolutions of the character and ID models, (width, height)
+ID_RES = (15, 30)
 ID_TOP = 130
 ID_BOT = 185
 ID_LEFT = 110
@@ -38,6 +46,7 @@ font_size = 0.5
 
 AREA_LOWER_THRES = 10000
 AREA_UPPER_THRES = 1000000
+MAX_PLATES = 3  # max plates read per frame
 
 ROWS = 720
 COLS = 1280
@@ -50,9 +59,14 @@ class PlateReader:
         self.bridge = CvBridge()
         if script_run:
             self.image_sub = rospy.Subscriber("/R1/pi_camera/image_raw", Image, self.callback)
-        self.num_reader = CharReader(PATH_NUM_MODEL)
-        self.alpha_reader = CharReader(PATH_ALPHA_MODEL)
-        self.id_reader = CharReader(PATH_PARKING_ID)
+        server = get_server()
+        self.num_reader = server.char_reader(PATH_NUM_MODEL)
+        self.alpha_reader = server.char_reader(PATH_ALPHA_MODEL)
+        self.id_reader = server.char_reader(PATH_PARKING_ID)
+        # 4 characters, then the parking ID
+        crops = [((int(pos*CAR_WIDTH/4), PLATE_I, int((pos + 1)*CAR_WIDTH/4), PLATE_F), CHAR_RES) for pos in range(4)]
+        crops.append(((ID_LEFT, ID_TOP, ID_RIGHT, ID_BOT), ID_RES))
+        self.rectifier = PlateRectifier(CAR_WIDTH, CAR_HEIGHT, crops, inter_res=PLATE_RES)
         self.i = 0
 
     def get_moments(self, img, debug=False):
@@ -69,13 +83,10 @@ class PlateReader:
             list[float]: a list of the largest contours
         """
         
-        contours, hierarchy = cv2.findContours(
-            image=img, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE)
-
         # gets the biggest contour and its info
-        if not contours:
+        c = contour_analysis.largest(img)
+        if not len(c):
             return []
-        c = max(contours, key=cv2.contourArea)
         M = cv2.moments(c)
         cx = int(M['m10']/M['m00'])
         cy = int(M['m01']/M['m00'])
@@ -92,7 +103,7 @@ class PlateReader:
             data (Image): For every new image, process that checks and reads plate
         """        
         try:
-            cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+            cv_image = imgmsg_to_bgr(data)
         except CvBridgeError as e:
             print(e)
 
@@ -111,17 +122,18 @@ class PlateReader:
                 print(p)
             print("")
 
-    def prediction_data_license(self, img):
+    def prediction_data_license(self, img, ctx=None):
         """Obtains the cnn's prediction data of a license plate.
 
         Args:
             img (cv::Mat): Raw image data containing a license plate to predict on
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
 
         Returns:
             tuple[str, ndarray]: string of characters representing the predicted license plate, and a 2D array of length 4, each element being an array containing the predicted probablities 
             of the corresponding character. Returns an empty string and an empty list if the image is invalid.
         """        
-        p_v = self.get_plate_view(img)
+        p_v = self.get_plate_view(img, ctx)
         if list(p_v):
             c_img = self.get_char_imgs(p_v)
             pred, pred_vecs = self.characters(c_img, get_pred_vec=True)
@@ -129,17 +141,18 @@ class PlateReader:
         else:
             return "", []
 
-    def prediction_data_id(self, img):
+    def prediction_data_id(self, img, ctx=None):
         """Obtains the cnn's prediction data of a plate ID.
 
         Args:
             img (cv::Mat): Raw image data containing a license plate to predict on
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
 
         Returns:
             tuple[str, array]: Number of the license plate ID and a 1D array containing the predicted probablities 
             of the corresponding character. Returns an empty string and an empty list if the image is invalid.
         """        
-        p_v = self.get_plate_view(img)
+        p_v = self.get_plate_view(img, ctx)
         if list(p_v):
             id_img = self.plate_id_img(p_v)
             pred_vec = self.id_reader.predict_char(id_img, id=True)
@@ -148,52 +161,175 @@ class PlateReader:
         else:
             return "", []
 
-    def get_plate_view(self, img):
+    def read_plate(self, img, ctx=None, read_lp=True, tracker=None):
+        """Obtains the cnn's prediction data of both the plate ID and the license plate of the largest plate in view (see read_plates).
+
+        Returns:
+            tuple[str, array, str, ndarray]: the plate ID and its predicted probabilities, and the license plate and its predicted probabilities 
+            (see prediction_data_id, prediction_data_license). Empty strings and lists are returned for invalid images, 
+            for skipped reads, and for the license plate if it is not read (or its ID is settled).
+        """        
+        plates = self.read_plates(img, ctx, read_lp, tracker, max_plates=1)
+        return plates[0] if plates else ("", [], "", [])
+
+    def read_plates(self, img, ctx=None, read_lp=True, tracker=None, max_plates=MAX_PLATES):
+        """Obtains the cnn's prediction data of both the plate ID and the license plate of every plate in view, 
+        with a single forward pass per model.
+
+        Args:
+            img (cv::Mat): Raw image data containing license plates to predict on
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
+            read_lp (bool, optional): False to skip the license plate predictions. Defaults to True.
+            tracker (PlateTracker, optional): tracker of the largest plate in view, to skip the cnns when it is not needed. Defaults to None.
+            max_plates (int, optional): max number of plates read. Defaults to MAX_PLATES.
+
+        Returns:
+            list[tuple[str, array, str, ndarray]]: for every plate read, largest first, the plate ID and its predicted probabilities, 
+            and the license plate and its predicted probabilities (see read_plate). Empty list for invalid images and skipped reads.
+        """        
+        with instrument.stage("plate_extract"):
+            quads = self.plate_quads(img, ctx, max_plates)
+            tracked = False
+            if tracker is not None:
+                if not quads:
+                    tracker.lost()
+                elif tracker.should_read(quads[0]):
+                    tracked = True
+                else:
+                    # the other plates are still read
+                    quads = quads[1:]
+            if not quads:
+                return []
+            # character and ID crops at model resolution, in reused buffers
+            type = ctx.type if ctx is not None else "bgr"
+            crops = [self.rectifier.rectify(verticies, img, type, slot=i) for i, verticies in enumerate(quads)]
+        with instrument.stage("id_cnn"):
+            pred_id_vecs = self.id_reader.predict_chars([c[4] for c in crops], id=True)
+            pred_ids = [self.id_reader.interpret(vec) for vec in pred_id_vecs]
+        if tracked:
+            tracker.update(pred_ids[0])
+        plates = [[pred_id, pred_id_vec, "", []] for pred_id, pred_id_vec in zip(pred_ids, pred_id_vecs)]
+        to_read = [i for i, pred_id in enumerate(pred_ids) 
+                   if read_lp and pred_id and not (tracker is not None and tracker.settled(pred_id))]
+        if to_read:
+            with instrument.stage("char_cnn"):
+                lps = self.plates_characters([crops[i][:4] for i in to_read])
+            for i, (pred_lp, pred_lp_vecs) in zip(to_read, lps):
+                plates[i][2:] = [pred_lp, pred_lp_vecs]
+        return [tuple(plate) for plate in plates]
+
+    def get_plate_view(self, img, ctx=None):
         """Obtains the projected rectangular view of a license plate contained within the input image.
 
         Args:
             img (cv::Mat): Raw image data containing the license plate.
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
 
         Returns:
             cv::Mat: Projected view of the license plate, or empty list if invalid image.
         """        
-        processed_im = ImageProcessor.filter_plate(img, ImageProcessor.plate_low, ImageProcessor.plate_up)
-        c = self.get_moments(processed_im)
-        if not list(c):
-            # no contour
-            return []
-        area = cv2.contourArea(c)
-        if area < AREA_LOWER_THRES or area > AREA_UPPER_THRES:
-            return []
-        approx = self.approximate_plate(c, epsilon=0.1)
-        verticies = self.verticies(approx_c=approx)
-        
+        verticies = self.plate_quad(img, ctx)
         if not list(verticies):
-            # no verticies (i.e. no perspec. transform)
             return []
+        return self.warp_plate(verticies, img, ctx)
+
+    def plate_quad(self, img, ctx=None):
+        """Obtains the verticies of the largest license plate contained within the input image.
+
+        Args:
+            img (cv::Mat): Raw image data containing the license plate.
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
+
+        Returns:
+            ndarray: verticies of the plate (see verticies), or empty list if invalid image.
+        """        
+        quads = self.plate_quads(img, ctx, max_plates=1)
+        return quads[0] if quads else []
+
+    def plate_quads(self, img, ctx=None, max_plates=MAX_PLATES):
+        """Obtains the verticies of every license plate contained within the input image, largest first.
+
+        Args:
+            img (cv::Mat): Raw image data containing the license plates.
+            ctx (FrameContext, optional): context of the same image, to reuse its filtered images. Defaults to None.
+            max_plates (int, optional): max number of plates. Defaults to MAX_PLATES.
+
+        Returns:
+            list[ndarray]: verticies of each plate (see verticies), empty if there is no valid plate.
+        """        
+        if ctx is not None:
+            contours, areas = ctx.contours(ImageProcessor.plate_low, ImageProcessor.plate_up, plate=True, min_area=AREA_LOWER_THRES)
+        else:
+            processed_im = ImageProcessor.filter_plate(img, ImageProcessor.plate_low, ImageProcessor.plate_up)
+            contours, areas = contour_analysis.top(*contour_analysis.find(processed_im, nested=True), min_area=AREA_LOWER_THRES)
+        quads = []
+        for c, area in zip(contours, areas):
+            if area > AREA_UPPER_THRES:
+                continue
+            approx = self.approximate_plate(c, epsilon=0.1)
+            if len(approx) != 4:
+                # not a quadrilateral
+                continue
+            verticies = self.verticies(approx_c=approx)
+            if not len(verticies) or any(PlateReader.quad_contains(q, verticies) for q in quads):
+                # invalid, or a nested contour of a plate already found
+                continue
+            quads.append(verticies)
+            if len(quads) == max_plates:
+                break
+        return quads
+
+    @staticmethod
+    def quad_contains(quad, verticies):
+        """bool: True if the center of the verticies is inside the bounding box of the quad."""
+        cx, cy = np.mean(verticies, axis=0)
+        return np.amin(quad[:,0]) <= cx <= np.amax(quad[:,0]) and np.amin(quad[:,1]) <= cy <= np.amax(quad[:,1])
+
+    def warp_plate(self, verticies, img, ctx=None):
+        """Projects the license plate to a rectangular view.
+
+        Args:
+            verticies (ndarray): verticies of the plate (see plate_quad)
+            img (cv::Mat): Raw image data containing the license plate.
+            ctx (FrameContext, optional): context of the same image. Defaults to None.
+
+        Returns:
+            cv::Mat: Projected view of the license plate
+        """        
         plate_view = self.transform_perspective(CAR_WIDTH, CAR_HEIGHT, verticies, img)
+        if ctx is not None and ctx.type == "rgb":
+            # only the plate view is swapped to bgr, not the whole frame
+            plate_view = cv2.cvtColor(plate_view, cv2.COLOR_RGB2BGR)
         return plate_view
 
-    def characters(self, char_imgs, get_pred_vec=False):
+    def characters(self, char_imgs, get_pred_vec=False, batched=True):
         """Gets the neural network predicted characters from the images of each character.
 
         Args:
             char_imgs (array[Image]): Array (length 4) of character images from the license plate.
                 First two images should be of letters, second two should be of numbers.
             get_pred_vec (bool, optional): True if prediction data should also be returned. Defaults to False.
+            batched (bool, optional): True to predict the letters and numbers with one forward pass per model, 
+                False to predict each character separately. Defaults to True.
         Returns:
             str or tuple[str,ndarray]: a string representing the license plate. Also returns the prediction probabilities for each character if set to true. 
         """
         
-        pred_vecs = []
-        license_plate = ''
+        if batched:
+            license_plate, pred_vecs = self.plates_characters([char_imgs])[0]
+            return (license_plate, pred_vecs) if get_pred_vec else license_plate
+
+        prediction_vecs = []
         for index,img in enumerate(char_imgs):
             if index < 2:
-                prediction_vec = self.alpha_reader.predict_char(img=img)
-                license_plate += CharReader.interpret(predict_vec=prediction_vec)
+                prediction_vecs.append(self.alpha_reader.predict_char(img=img))
             else:
-                prediction_vec = self.num_reader.predict_char(img=img)
-                license_plate += CharReader.interpret(predict_vec=prediction_vec)
+                prediction_vecs.append(self.num_reader.predict_char(img=img))
+
+        pred_vecs = []
+        license_plate = ''
+        for prediction_vec in prediction_vecs:
+            license_plate += CharReader.interpret(predict_vec=prediction_vec)
             pred_vecs.append(np.round(np.array(prediction_vec), 3))
 
         if get_pred_vec:
@@ -201,6 +337,24 @@ class PlateReader:
         else:
             return license_plate
 
+    def plates_characters(self, plates_char_imgs):
+        """Gets the neural network predicted characters of several plates, with a single forward pass per model.
+
+        Args:
+            plates_char_imgs (list[array[Image]]): the character images of every plate (see characters)
+
+        Returns:
+            list[tuple[str,ndarray]]: the license plate and the prediction probabilities for each character, of every plate
+        """
+        alpha_vecs = self.alpha_reader.predict_chars([img for char_imgs in plates_char_imgs for img in char_imgs[:2]])
+        num_vecs = self.num_reader.predict_chars([img for char_imgs in plates_char_imgs for img in char_imgs[2:]])
+        out = []
+        for k in range(len(plates_char_imgs)):
+            prediction_vecs = [alpha_vecs[2*k], alpha_vecs[2*k + 1], num_vecs[2*k], num_vecs[2*k + 1]]
+            license_plate = ''.join(CharReader.interpret(predict_vec=vec) for vec in prediction_vecs)
+            out.append((license_plate, np.array([np.round(np.array(vec), 3) for vec in prediction_vecs])))
+        return out
+
     def get_char_imgs(self, plate):
         """Gets the verticies of a simple shape such as a square, rectangle, etc.
 
@@ -223,16 +377,12 @@ class PlateReader:
         Returns:
             ndarray: verticies of the contour, from top to bottom, left to right. Empty list returned if invalid verticies.
         """
-        n = approx_c.ravel()
-        pts = np.float32(self.get_coords(n)).reshape(-1, 2)
-        sorted_pts = PlateReader.contour_coords_sorted(pts)
-        if not list(sorted_pts):
+        sorted_pts = order_corners(approx_c)
+        if not len(sorted_pts):
             return []
 
-        sorted_pts_np = np.array(sorted_pts)
-        if 0 in sorted_pts_np[:,0] or COLS-1 in sorted_pts_np[:,0]:
-            return []
-        if 0 in sorted_pts_np[:,1] or ROWS-1 in sorted_pts_np[:,1]:
+        # plates cut by the edge of the frame
+        if np.any(sorted_pts == 0) or np.any(sorted_pts[:,0] == COLS-1) or np.any(sorted_pts[:,1] == ROWS-1):
             return []
         return sorted_pts
 
@@ -286,62 +436,6 @@ class PlateReader:
         Mat = cv2.getPerspectiveTransform(sorted_pts, pts)
         return cv2.warpPerspective(image, Mat, (width, height))
 
-    def get_coords(self, contour):
-        """Args: Approximated contour extracted with CHAIN_APPROX_NONE (only the verticies)
-           Returns: List of verticies in (x,y) coords"""
-        i = 0
-        coords = []
-        for j in contour:
-            if (i % 2 == 0):
-                x = contour[i]
-                y = contour[i + 1]
-                coords.append((x, y))
-            i += 1
-            
-        return coords
-
-    @staticmethod
-    def contour_coords_sorted(list_of_points):
-        """Sorts the verticies of a contour so it can be perspective transformed
-        
-        Args: 
-            list[float]: List of contour verticies. Should have exactly 4 verticies with (x,y)
-        
-        Returns: 
-            ndarray: Verticies in list sorted by top to bottom, left to right, with each verticies being an array with [col, row]
-        """
-        avg_y = 0
-        avg_x = 0
-        for i in list_of_points:
-            avg_y += i[1]
-            avg_x += i[0]
-
-        avg_y = int(avg_y/4)
-        avg_x = int(avg_x/4)
-
-        tl = tr = bl = br = None
-
-        for i in list_of_points:
-            if (int(i[1]) < avg_y and int(i[0]) < avg_x):
-                tl = i
-            elif (int(i[1]) < avg_y):
-                tr = i
-            elif (int(i[0]) < avg_x):
-                bl = i
-            else:
-                br = i
-                
-        if tl is None or tr is None or bl is None or br is None:
-            return []
-
-        tl = list(tl)
-        tr = list(tr)
-        bl = list(bl)
-        br = list(br)
-
-        coords = [tl, tr, bl, br]
-        return np.float32(coords).reshape(-1, 2)
-
 def main(args):
     pr = PlateReader(script_run=True)
     rospy.init_node('image_converter', anonymous=True)
@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+
+class PlateRectifier:
+    """This class extracts the crops of a license plate (e.g. characters, parking ID) at their final resolution,
+    from the raw image, into preallocated buffers.
+
+    A crop is a region of the rectangular plate view (see PlateReader.transform_perspective), resized to a resolution.
+    Without an intermediate resolution (the default), the perspective transform of the plate is composed with the
+    scaling of every crop, so each crop is a single small warp of the raw image. With one, the crops are resampled
+    in two stages instead: the plate view is warped, then each region is resized to the intermediate resolution,
+    then to its own. The cnns were trained on the two stage crops, and the single warp changes the pixels enough
+    to change the predictions (see benchmark.bench_rectify): PlateReader opts in with PLATE_RES.
+    Every slot (e.g. one per plate in view) has its own buffers, reused by every call: copy the crops to keep them.
+    """
+
+    def __init__(self, width, height, crops, inter_res=None):
+        """Creates a PlateRectifier object.
+
+        Args:
+            width (int): width of the plate view
+            height (int): height of the plate view
+            crops (list[tuple]): ((left, top, right, bottom), (width, height)) of every crop: its region in the plate view,
+                and its resolution.
+            inter_res (tuple[int], optional): width and height every region is resized to before its own resolution.
+                Defaults to None (single warp per crop).
+        """
+        self.size = (width, height)
+        self.view_pts = np.float32([[0, 0], [width, 0],
+                                    [0, height], [width, height]])
+        self.boxes = [box for box, res in crops]
+        self.crop_maps = [PlateRectifier.crop_map(box, res) for box, res in crops]
+        self.sizes = [res for box, res in crops]
+        self.inter_res = inter_res
+        self.quads = {}  # slot -> verticies of the cached transforms
+        self.mats = {}  # slot -> transforms
+        self.bufs = {}  # slot -> (color buffers, gray buffers)
+        self.view_bufs = {}  # slot -> (plate view, intermediate buffer), two stage only
+
+    @staticmethod
+    def crop_map(box, res):
+        """Maps coordinates of the plate view to coordinates of a crop, with the pixel centers of cv2.resize.
+
+        Args:
+            box (tuple[int]): left, top, right, bottom of the crop in the plate view
+            res (tuple[int]): width and height of the crop
+
+        Returns:
+            ndarray: 3x3 affine matrix
+        """
+        left, top, right, bottom = box
+        sx = res[0] / float(right - left)
+        sy = res[1] / float(bottom - top)
+        return np.array([[sx, 0, 0.5*sx - 0.5 - left*sx],
+                         [0, sy, 0.5*sy - 0.5 - top*sy],
+                         [0, 0, 1]])
+
+    def transforms(self, verticies, slot=0):
+        """Perspective transforms from the raw image to the plate view, and to every crop.
+        Cached for the last verticies of each slot.
+
+        Args:
+            verticies (ndarray): verticies of the plate, sorted (see quad.order_corners)
+            slot (int, optional): slot of the plate. Defaults to 0.
+
+        Returns:
+            tuple[ndarray, list[ndarray]]: 3x3 matrix of the plate view, and of every crop
+        """
+        quad = self.quads.get(slot)
+        if quad is None or not np.array_equal(quad, verticies):
+            view_mat = cv2.getPerspectiveTransform(np.float32(verticies), self.view_pts)
+            self.mats[slot] = (view_mat, [crop_mat.dot(view_mat) for crop_mat in self.crop_maps])
+            self.quads[slot] = np.array(verticies, copy=True)
+        return self.mats[slot]
+
+    def buffers(self, slot=0):
+        """Obtains the color and gray buffers of a slot, allocating them on first use.
+
+        Args:
+            slot (int, optional): slot of the plate. Defaults to 0.
+
+        Returns:
+            tuple[list[ndarray], list[ndarray]]: the color and the gray buffer of every crop
+        """
+        if slot not in self.bufs:
+            self.bufs[slot] = ([np.empty((h, w, 3), dtype=np.uint8) for w, h in self.sizes],
+                               [np.empty((h, w), dtype=np.uint8) for w, h in self.sizes])
+            if self.inter_res is not None:
+                w, h = self.size
+                iw, ih = self.inter_res
+                self.view_bufs[slot] = (np.empty((h, w, 3), dtype=np.uint8), np.empty((ih, iw, 3), dtype=np.uint8))
+        return self.bufs[slot]
+
+    def rectify(self, verticies, img, type="bgr", slot=0):
+        """Extracts the grayscaled crops of a license plate.
+
+        Args:
+            verticies (ndarray): verticies of the plate, sorted (see quad.order_corners)
+            img (cv::Mat): raw image data containing the plate
+            type (str, optional): channel order of the image, "bgr" or "rgb". Defaults to "bgr".
+            slot (int, optional): slot of the plate, to keep the crops of several plates at once. Defaults to 0.
+
+        Returns:
+            list[cv::Mat]: the grayscaled crops, in order, in the reused buffers
+        """
+        code = cv2.COLOR_RGB2GRAY if type == "rgb" else cv2.COLOR_BGR2GRAY
+        color_bufs, gray_bufs = self.buffers(slot)
+        view_mat, crop_mats = self.transforms(verticies, slot)
+        if self.inter_res is None:
+            for mat, size, color in zip(crop_mats, self.sizes, color_bufs):
+                cv2.warpPerspective(img, mat, size, dst=color)
+        else:
+            view, inter = self.view_bufs[slot]
+            cv2.warpPerspective(img, view_mat, self.size, dst=view)
+            for (left, top, right, bottom), size, color in zip(self.boxes, self.sizes, color_bufs):
+                cv2.resize(view[top:bottom, left:right], self.inter_res, dst=inter)
+                cv2.resize(inter, size, dst=color)
+        for color, gray in zip(color_bufs, gray_bufs):
+            cv2.cvtColor(color, code, dst=gray)
+        return gray_bufs
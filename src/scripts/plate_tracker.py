@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class PlateTracker:
+    """This class tracks the plate in view across frames, by the quad of its contour (see PlateReader.plate_quads),
+    to skip the cnn reads of a plate that has already been read with enough confidence.
+
+    The plate is read again when its quad moves significantly (e.g. a new plate), when the accumulated
+    evidence for its ID is not confident yet, or at least every MAX_SKIP frames. The license plate of an ID
+    whose evidence is settled is not read at all (see settled). Used by PlateReader.read_plates.
+    """
+    QUAD_CHANGE_THRES = 0.15  # max corner displacement, relative to the quad's diagonal
+    MAX_SKIP = 10
+
+    def __init__(self, is_confident, is_settled=None, quad_change_thres=QUAD_CHANGE_THRES, max_skip=MAX_SKIP):
+        """Creates a PlateTracker object, without any plate.
+
+        Args:
+            is_confident (function): function of a plate ID, True if its accumulated evidence is confident
+            is_settled (function, optional): function of a plate ID, True if its license plate is known. Defaults to None.
+            quad_change_thres (float, optional): quad change above which the plate is read again. Defaults to QUAD_CHANGE_THRES.
+            max_skip (int, optional): max number of consecutive skipped reads. Defaults to MAX_SKIP.
+        """
+        self.is_confident = is_confident
+        self.is_settled = is_settled
+        self.quad_change_thres = quad_change_thres
+        self.max_skip = max_skip
+        self.quad = None
+        self.plate_id = ""
+        self.num_skips = 0
+        self.reads = 0
+        self.skips = 0
+
+    @staticmethod
+    def quad_change(quad1, quad2):
+        """Change between two quads.
+
+        Args:
+            quad1 (ndarray): reference verticies, sorted (see quad.order_corners)
+            quad2 (ndarray): verticies, sorted the same way
+
+        Returns:
+            float: max corner displacement, relative to the diagonal of the reference quad
+        """
+        diag = np.linalg.norm(quad1[3] - quad1[0])
+        return np.amax(np.linalg.norm(quad2 - quad1, axis=1)) / max(diag, 1)
+
+    def should_read(self, quad):
+        """Determines whether or not the plate in view needs to be read by the cnns. Updates this object.
+
+        Args:
+            quad (ndarray): verticies of the plate in view
+
+        Returns:
+            bool: True if the plate should be read, False if the read can be skipped.
+        """
+        same_plate = self.quad is not None and PlateTracker.quad_change(self.quad, quad) < self.quad_change_thres
+        self.quad = quad
+        if same_plate and self.plate_id and self.num_skips < self.max_skip and self.is_confident(self.plate_id):
+            self.num_skips += 1
+            self.skips += 1
+            return False
+        if not same_plate:
+            self.plate_id = ""
+        self.num_skips = 0
+        self.reads += 1
+        return True
+
+    def settled(self, plate_id):
+        """Determines whether or not the license plate of a plate ID is already known, so that it does not need to be read.
+
+        Args:
+            plate_id (str): the predicted plate ID
+
+        Returns:
+            bool: True if the license plate read can be skipped.
+        """
+        return self.is_settled is not None and bool(plate_id) and self.is_settled(plate_id)
+
+    def update(self, plate_id):
+        """Records the ID read for the tracked plate.
+
+        Args:
+            plate_id (str): the predicted plate ID, empty if invalid
+        """
+        self.plate_id = plate_id
+
+    def lost(self):
+        """Forgets the tracked plate (i.e. no plate in view).
+        """
+        self.quad = None
+        self.plate_id = ""
+        self.num_skips = 0
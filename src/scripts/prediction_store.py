@@ -0,0 +1,156 @@
+import numpy as np
+
+NUM_IDS = 8  # plate IDs 1 to 8
+NUM_CHARS = 4
+ALPHA_CLASSES = 26
+NUM_CLASSES = 10
+CHAR_CLASSES = ALPHA_CLASSES + NUM_CLASSES  # letters first, then digits
+
+
+class PredictionStore:
+    """This class accumulates the predictions of every plate ID and of every license plate predicted for it (its candidates),
+    in fixed-shape arrays.
+
+    Per ID, it keeps the number of predictions and the sum of the ID's prediction vectors. Per candidate, it keeps the number
+    of predictions and the sum of its prediction vectors, as a (NUM_CHARS, CHAR_CLASSES) matrix where the letters occupy the
+    first ALPHA_CLASSES columns and the digits the last NUM_CLASSES. Updates are constant time, and the best candidate of
+    every ID is maintained with each update: the most frequent one, ties broken by the largest sum of squared max probabilities.
+    """
+    INIT_CANDIDATES = 16
+
+    def __init__(self, num_candidates=INIT_CANDIDATES):
+        """Creates an empty PredictionStore object.
+
+        Args:
+            num_candidates (int, optional): initial capacity of candidates per ID, doubled when full. Defaults to INIT_CANDIDATES.
+        """
+        self.id_counts = np.zeros(NUM_IDS, dtype=np.int64)
+        self.id_vecs = np.zeros((NUM_IDS, NUM_IDS))
+        self.lp_counts = np.zeros((NUM_IDS, num_candidates), dtype=np.int64)
+        self.lp_vecs = np.zeros((NUM_IDS, num_candidates, NUM_CHARS, CHAR_CLASSES))
+        self.num_lps = np.zeros(NUM_IDS, dtype=np.int64)
+        self.best_slot = np.full(NUM_IDS, -1, dtype=np.int64)
+        self.slots = [{} for _ in range(NUM_IDS)]  # license plate -> candidate slot, per ID
+        self.lps = [[] for _ in range(NUM_IDS)]  # candidate slot -> license plate, per ID
+
+    @staticmethod
+    def index(plate_id):
+        """int: the row of a plate ID, -1 if not a valid ID."""
+        if len(plate_id) != 1 or not '1' <= plate_id <= str(NUM_IDS):
+            return -1
+        return ord(plate_id) - ord('1')
+
+    def grow(self):
+        """Doubles the capacity of candidates per ID.
+        """
+        self.lp_counts = np.concatenate((self.lp_counts, np.zeros_like(self.lp_counts)), axis=1)
+        self.lp_vecs = np.concatenate((self.lp_vecs, np.zeros_like(self.lp_vecs)), axis=1)
+
+    def slot(self, i, lp):
+        """Obtains the candidate slot of a license plate for an ID row, adding it if new.
+
+        Args:
+            i (int): row of the plate ID
+            lp (str): the license plate
+
+        Returns:
+            int: the candidate slot
+        """
+        s = self.slots[i].get(lp)
+        if s is None:
+            s = int(self.num_lps[i])
+            if s == self.lp_counts.shape[1]:
+                self.grow()
+            self.slots[i][lp] = s
+            self.lps[i].append(lp)
+            self.num_lps[i] += 1
+        return s
+
+    def add(self, plate_id, pred_id_vec, lp, pred_lp_vecs):
+        """Adds a prediction of a plate.
+
+        Args:
+            plate_id (str): the predicted plate ID
+            pred_id_vec (array): the predicted probabilities of the ID
+            lp (str): the predicted license plate
+            pred_lp_vecs (list[array]): the predicted probabilities of each character (see PlateReader.characters)
+        """
+        i = PredictionStore.index(plate_id)
+        if i < 0:
+            return
+        self.id_counts[i] += 1
+        self.id_vecs[i] += pred_id_vec
+        s = self.slot(i, lp)
+        self.lp_counts[i, s] += 1
+        vecs = self.lp_vecs[i, s]
+        for c, vec in enumerate(pred_lp_vecs):
+            start = 0 if len(vec) == ALPHA_CLASSES else ALPHA_CLASSES
+            vecs[c, start:start + len(vec)] += vec
+        # only the updated candidate can overtake the best one
+        b = self.best_slot[i]
+        if b < 0 or b == s or self.lp_counts[i, s] > self.lp_counts[i, b] or \
+                (self.lp_counts[i, s] == self.lp_counts[i, b] and self.score(i, s) > self.score(i, b)):
+            self.best_slot[i] = s
+
+    def score(self, i, s):
+        """float: the sum of squared max probabilities of a candidate, to break frequency ties."""
+        return float(np.sum(np.amax(self.lp_vecs[i, s], axis=1)**2))
+
+    def ids(self):
+        """list[str]: the plate IDs with at least one prediction."""
+        return [chr(ord('1') + i) for i in np.flatnonzero(self.id_counts)]
+
+    def id_count(self, plate_id):
+        """int: the number of predictions of a plate ID."""
+        i = PredictionStore.index(plate_id)
+        return int(self.id_counts[i]) if i >= 0 else 0
+
+    def id_mean(self, plate_id):
+        """array: the mean prediction vector of a plate ID."""
+        i = PredictionStore.index(plate_id)
+        return self.id_vecs[i] / max(self.id_counts[i], 1)
+
+    def candidates(self, plate_id):
+        """list[str]: the license plates predicted for a plate ID, in order of first prediction."""
+        i = PredictionStore.index(plate_id)
+        return list(self.lps[i]) if i >= 0 else []
+
+    def freqs(self, plate_id):
+        """array: the number of predictions of every candidate of a plate ID (see candidates)."""
+        i = PredictionStore.index(plate_id)
+        if i < 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.lp_counts[i, :self.num_lps[i]]
+
+    def means(self, plate_id):
+        """ndarray: the mean prediction matrices of every candidate of a plate ID, of shape (candidates, NUM_CHARS, CHAR_CLASSES), empty if the ID is invalid."""
+        i = PredictionStore.index(plate_id)
+        if i < 0:
+            return np.zeros((0, NUM_CHARS, CHAR_CLASSES))
+        n = self.num_lps[i]
+        return self.lp_vecs[i, :n] / self.lp_counts[i, :n, np.newaxis, np.newaxis]
+
+    def best(self, plate_id):
+        """str: the best license plate of a plate ID, None if it has no prediction."""
+        i = PredictionStore.index(plate_id)
+        if i < 0 or self.best_slot[i] < 0:
+            return None
+        return self.lps[i][self.best_slot[i]]
+
+    def is_confident(self, plate_id, min_id_freq, min_lp_freq, min_lp_share):
+        """Determines whether or not the predictions of a plate ID agree enough.
+
+        Args:
+            plate_id (str): the plate ID
+            min_id_freq (int): min number of predictions of the ID
+            min_lp_freq (int): min number of predictions of its best license plate
+            min_lp_share (float): min share of the ID's predictions for its best license plate
+
+        Returns:
+            bool: True if the predictions are confident, False otherwise.
+        """
+        if self.id_count(plate_id) < min_id_freq:
+            return False
+        freqs = self.freqs(plate_id)
+        best_freq = np.amax(freqs)
+        return best_freq >= min_lp_freq and best_freq >= min_lp_share*np.sum(freqs)
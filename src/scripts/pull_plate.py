@@ -11,8 +11,12 @@ import random
 import numpy as np
 from sensor_msgs.msg import Image
 from cv_bridge import CvBridge, CvBridgeError
+from ros_image import imgmsg_to_bgr
 from char_reader import CharReader
-from plate_reader import PlateReader
+from quad import order_corners
+import contour_analysis
+from startup import LazyModel, ModelLoader
+from model_server import get_server
 
 
 """
@@ -57,7 +61,8 @@ class PlatePull:
         self.bridge = CvBridge()
         self.image_sub = rospy.Subscriber(
             "/R1/pi_camera/image_raw", Image, self.callback)
-        self.id_reader = CharReader(PATH_PARKING_ID)
+        self.id_reader = LazyModel("id reader", lambda: get_server().char_reader(PATH_PARKING_ID))
+        ModelLoader([self.id_reader]).start()
         self.i = 0
 
     def process_stream(self, image):
@@ -83,23 +88,14 @@ class PlatePull:
         Returns:
             list(float): the top contour areas, sorted in descending order
         """        
-        contours, hierarchy = cv2.findContours(
-            image=img, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE)
-        cs = sorted(contours, key=cv2.contourArea, reverse=True)
-        if len(cs) > nums:
-            cs = cs[:nums]
-        areas = [cv2.contourArea(c) for c in cs] 
-        return areas
+        return contour_analysis.top_areas(img, nums)
 
     def get_moments(self, img):
         """Returns c, cx, cy. (Usually cx, cy are only important for debugging text)
         c is the largest contour; 
         cx, cy is the center of mass of the largest contour"""
-        contours, hierarchy = cv2.findContours(
-            image=img, mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE)
-
         # gets the biggest contour and its info
-        c = max(contours, key=cv2.contourArea)
+        c = contour_analysis.largest(img)
         M = cv2.moments(c)
         cx = int(M['m10']/M['m00'])
         cy = int(M['m01']/M['m00'])
@@ -108,7 +104,7 @@ class PlatePull:
 
     def callback(self, data):
         try:
-            cv_image = self.bridge.imgmsg_to_cv2(data, "bgr8")
+            cv_image = imgmsg_to_bgr(data)
         except CvBridgeError as e:
             print(e)
 
@@ -126,11 +122,8 @@ class PlatePull:
         perimiter = cv2.arcLength(c, True)
         approx = cv2.approxPolyDP(c, epsilon*perimiter, True)
 
-        n = approx.ravel()
-        pts = np.float32(self.get_coords(n)).reshape(-1, 2)
-        # sorted_pts = self.contour_coords_sorted(pts)
-        sorted_pts = PlateReader.contour_coords_sorted(pts)
-        if not list(sorted_pts):
+        sorted_pts = order_corners(approx)
+        if not len(sorted_pts):
             return
         cv2.putText(disp, "tl", (int(sorted_pts[0][0]), int(
             sorted_pts[0][1])), font, font_size, (0, 255, 0))
@@ -218,50 +211,6 @@ class PlatePull:
         Mat = cv2.getPerspectiveTransform(sorted_pts, pts)
         return cv2.warpPerspective(image, Mat, (width, height))
 
-    def get_coords(self, contour):
-        """Args: Approximated contour extracted with CHAIN_APPROX_NONE (only the verticies)
-           Returns: List of verticies in (x,y) coords"""
-        i = 0
-        coords = []
-        for j in contour:
-            if (i % 2 == 0):
-                x = contour[i]
-                y = contour[i + 1]
-                coords.append((x, y))
-
-            i = i + 1
-
-        return coords
-
-    def contour_coords_sorted(self, list_of_points):
-        """Args: List of contour verticies
-           Returns: Verticies in list sorted by top to bottom, left to right"""
-
-        avg_y = 0
-        avg_x = 0
-
-        for i in list_of_points:
-            avg_y += i[1]
-            avg_x += i[0]
-
-        avg_y = int(avg_y/4)
-        avg_x = int(avg_x/4)
-        tl = tr = bl = br = None
-        for i in list_of_points:
-            if (int(i[1]) < avg_y and int(i[0]) < avg_x):
-                tl = i
-            elif (int(i[1]) < avg_y):
-                tr = i
-            elif (int(i[0]) < avg_x):
-                bl = i
-            else:
-                br = i
-
-        coords = [list(tl), list(tr), list(bl), list(br)]
-
-        return np.float32(coords).reshape(-1, 2)
-
-
 def main(args):
     pp = PlatePull()
 
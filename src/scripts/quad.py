@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def order_corners(approx):
+    """Sorts the verticies of a quadrilateral so it can be perspective transformed.
+
+    The top left corner has the smallest x+y and the bottom right the largest, the top right has the smallest y-x
+    and the bottom left the largest, which holds for a plate rotated by up to 45 degrees either way.
+
+    Args:
+        approx (ndarray): verticies of an approximated contour (see cv2.approxPolyDP), of shape (N, 1, 2) or (N, 2)
+
+    Returns:
+        ndarray: the 4 verticies as float32 [col, row] rows, sorted tl, tr, bl, br. Empty list if not exactly
+        4 distinct corners.
+    """
+    if len(approx) != 4:
+        # cheap rejection, before any work
+        return []
+    pts = np.float32(approx).reshape(4, 2)
+    s = pts[:, 0] + pts[:, 1]
+    d = pts[:, 1] - pts[:, 0]
+    corners = [np.argmin(s), np.argmin(d), np.argmax(d), np.argmax(s)]
+    if len(set(corners)) != 4:
+        # degenerate, e.g. two corners on the same diagonal
+        return []
+    return pts[corners]
@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+
+from __future__ import print_function
+
+import sys
+import os
+import time
+import copy
+import json
+import argparse
+import cv2
+import numpy as np
+import rospy
+from sensor_msgs.msg import Image
+
+from driver import Driver
+import instrument
+
+"""Offline replay of recorded frames through Driver.callback_img, without gazebo or a ros master.
+
+Usage: replay.py SOURCE [--rate FPS] [--out results.json]
+       replay.py --check
+SOURCE is a directory of images (replayed in sorted order), a video file, or a rosbag (.bag) containing
+the camera topic. --rate 0 replays as fast as possible.
+
+The driver's clock is the header stamp of the frames (recorded in a rosbag, or one every 1/Driver.FPS secs
+otherwise), so the state changes are the same whatever the replay rate.
+"""
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+CAMERA_TOPIC = "/R1/pi_camera/image_raw"
+
+
+class StubPublisher:
+    """This class stands in for a rospy.Publisher, and keeps every published message.
+    """
+
+    def __init__(self, topic):
+        """Creates a StubPublisher object.
+
+        Args:
+            topic (str): name of the topic, for reports
+        """
+        self.topic = topic
+        self.frame = 0
+        self.msgs = []
+
+    def publish(self, msg):
+        """Records a copy of the message (publishers may reuse and modify the same object), with the current frame number.
+
+        Args:
+            msg (any): the published message
+        """
+        self.msgs.append((self.frame, copy.deepcopy(msg)))
+
+
+def cv2_to_imgmsg(img, stamp=0):
+    """Converts bgr image data to a ros image message, as published by the camera.
+
+    Args:
+        img (cv::Mat): bgr image data
+        stamp (float, optional): time of the frame in secs, for its header stamp. Defaults to 0.
+
+    Returns:
+        sensor_msgs::Image: the image message
+    """
+    msg = Image()
+    msg.header.stamp = rospy.Time.from_sec(stamp)
+    msg.height, msg.width = img.shape[:2]
+    msg.encoding = "bgr8"
+    msg.step = msg.width*3
+    msg.data = np.ascontiguousarray(img).tobytes()
+    return msg
+
+
+def stamp_secs(msg):
+    """Clock of the replayed driver (see Driver).
+
+    Args:
+        msg (sensor_msgs::Image): image message
+
+    Returns:
+        float: the header stamp of the message, in secs
+    """
+    return msg.header.stamp.to_sec()
+
+
+def read_frames(source, fps=Driver.FPS):
+    """Reads the image messages of a recording, one at a time.
+
+    Args:
+        source (str): directory of images, video file or rosbag
+        fps (float, optional): frames per second of the stamps of images and videos, rosbags keeping their own stamps. 
+            Defaults to Driver.FPS.
+
+    Yields:
+        sensor_msgs::Image: the image messages, in order
+    """
+    if os.path.isdir(source):
+        filenames = [f for f in sorted(os.listdir(source)) if f.lower().endswith(IMAGE_EXTS)]
+        for i, filename in enumerate(filenames):
+            yield cv2_to_imgmsg(cv2.imread(os.path.join(source, filename)), i / fps)
+    elif source.endswith('.bag'):
+        import rosbag
+        with rosbag.Bag(source) as bag:
+            for topic, msg, t in bag.read_messages(topics=[CAMERA_TOPIC]):
+                yield msg
+    else:
+        cap = cv2.VideoCapture(source)
+        ok, img = cap.read()
+        i = 0
+        while ok:
+            yield cv2_to_imgmsg(img, i / fps)
+            ok, img = cap.read()
+            i += 1
+        cap.release()
+
+
+def replay(dv, frames, rate=0):
+    """Feeds image messages to Driver.callback_img, one after the other.
+
+    Args:
+        dv (Driver): driver with stub publishers
+        frames (iterable[sensor_msgs::Image]): image messages
+        rate (float, optional): frames per second to replay at, 0 for as fast as possible. Defaults to 0.
+
+    Returns:
+        tuple[list[float], float]: the latency of every callback in seconds, and the total replay time in seconds
+    """
+    latencies = []
+    period = 1.0 / rate if rate > 0 else 0
+    start = time.perf_counter()
+    for i, msg in enumerate(frames):
+        dv.twist_pub.frame = dv.license_pub.frame = i
+        if period:
+            wait = start + i*period - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        t0 = time.perf_counter()
+        dv.callback_img(msg)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def summary(latencies, total, twist_pub, license_pub):
+    """Summarizes a replay.
+
+    Args:
+        latencies (list[float]): latency of every callback in seconds
+        total (float): total replay time in seconds
+        twist_pub (StubPublisher): stub of the velocities publisher
+        license_pub (StubPublisher): stub of the plates publisher
+
+    Returns:
+        dict: throughput, latency percentiles (ms) and published messages
+    """
+    lat_ms = 1000.0*np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "frames": len(latencies),
+        "total_secs": total,
+        "fps": len(latencies) / total if total > 0 else 0,
+        "latency_ms": {
+            "mean": float(np.mean(lat_ms)),
+            "p50": float(np.percentile(lat_ms, 50)),
+            "p95": float(np.percentile(lat_ms, 95)),
+            "p99": float(np.percentile(lat_ms, 99)),
+            "max": float(np.amax(lat_ms))
+        },
+        "twist": [(i, m.linear.x, m.angular.z) for i, m in twist_pub.msgs],
+        "license_plate": [(i, m.data) for i, m in license_pub.msgs]
+    }
+
+
+def check_update_predictions(dv, plate_id="1", lp="AB12", reads=3):
+    """Regression check of Driver.update_predictions with the prediction data of PlateReader.plates_characters,
+    whose character vectors have the size of their model's classes (26, 26, 10, 10): the plate must be
+    accumulated and published.
+
+    Args:
+        dv (Driver): driver with stub publishers
+        plate_id (str, optional): plate ID of the outside loop. Defaults to "1".
+        lp (str, optional): license plate, 2 letters then 2 numbers. Defaults to "AB12".
+        reads (int, optional): number of identical reads, enough to be stable. Defaults to 3.
+    """
+    vecs = []
+    for c, size in zip(lp, (26, 26, 10, 10)):
+        vec = np.full(size, 0.001)
+        vec[ord(c) - ord('A') if c.isalpha() else int(c)] = 0.99
+        vecs.append(vec)
+    id_vec = np.zeros(8)
+    id_vec[int(plate_id) - 1] = 1
+    for i in range(reads):
+        dv.update_predictions(plate_id, id_vec, lp, vecs)
+    assert dv.preds.id_count(plate_id) == reads, dv.preds.id_count(plate_id)
+    assert dv.preds.best(plate_id) == lp, dv.preds.best(plate_id)
+    published = [m.data for i, m in dv.license_pub.msgs]
+    assert any(msg.endswith(',' + plate_id + ',' + lp) for msg in published), published
+    print("update_predictions: ok")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Replays recorded frames through Driver.callback_img")
+    parser.add_argument("source", nargs='?', help="directory of images, video file or rosbag")
+    parser.add_argument("--rate", type=float, default=0, help="frames per second, 0 for as fast as possible")
+    parser.add_argument("--out", default=None, help="json file to write the results to")
+    parser.add_argument("--check", action="store_true", help="run the regression checks of the driver instead of a replay")
+    opts = parser.parse_args(args[1:])
+    if not opts.check and opts.source is None:
+        parser.error("a source is required unless --check")
+
+    twist_pub = StubPublisher('/R1/cmd_vel')
+    license_pub = StubPublisher('/license_plate')
+    dv = Driver(script_run=False, twist_pub=twist_pub, license_pub=license_pub, clock=stamp_secs)
+    if opts.check:
+        check_update_predictions(dv)
+        return
+    # times the perception loop only, not the model loading
+    dv.model_loader.join()
+
+    latencies, total = replay(dv, read_frames(opts.source), opts.rate)
+    res = summary(latencies, total, twist_pub, license_pub)
+    print("frames: {}, fps: {:.1f}".format(res["frames"], res["fps"]))
+    print("latency (ms):", res["latency_ms"])
+    for i, plate in res["license_plate"]:
+        print(i, plate)
+    instrument.PROFILER.report()
+    res["stages"] = instrument.PROFILER.summary()
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(res, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+from cv_bridge import CvBridge
+
+"""Encodings that can be viewed in place, and their channel type (see ImageProcessor.filter)"""
+VIEW_ENCODINGS = {
+    "bgr8": "bgr",
+    "rgb8": "rgb"
+}
+BRIDGE = CvBridge()
+
+
+def imgmsg_to_array(msg):
+    """Converts a ros image message to image data without copying it, when the encoding is bgr8 or rgb8.
+    The returned array is a read-only view over the message data, in the channel order of the message:
+    a consumer that needs to modify it must copy it first.
+
+    Other encodings are converted to bgr with CvBridge.
+
+    Args:
+        msg (sensor_msgs::Image): the image message
+
+    Returns:
+        tuple[cv::Mat, str]: the image data, and its channel type ("bgr" or "rgb")
+    """
+    if msg.encoding in VIEW_ENCODINGS and msg.step == msg.width*3:
+        img = np.frombuffer(msg.data, dtype=np.uint8).reshape(msg.height, msg.width, 3)
+        return img, VIEW_ENCODINGS[msg.encoding]
+    return BRIDGE.imgmsg_to_cv2(msg, "bgr8"), "bgr"
+
+
+def imgmsg_to_bgr(msg):
+    """Converts a ros image message to bgr image data. Only copies the data when the channels must be swapped.
+
+    Args:
+        msg (sensor_msgs::Image): the image message
+
+    Returns:
+        cv::Mat: the image data, in bgr (read-only if not copied)
+    """
+    img, type = imgmsg_to_array(msg)
+    if type == "rgb":
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    return img
@@ -12,6 +12,7 @@ from hsv_view import ImageProcessor
 from std_msgs.msg import String
 from sensor_msgs.msg import Image
 from cv_bridge import CvBridge
+from ros_image import imgmsg_to_array
 from geometry_msgs.msg import Twist
 import numpy as np
 
@@ -23,6 +24,12 @@ class DataScraper:
     WIDTH, HEIGHT = (1280, 720)
     COMPRESSION_RATIO = 0.25
     CROPPED_ROW_START = 90
+    """Region of interest of the drive cnn in the raw image (see ImageProcessor.crop), cropped before filtering.
+    Resizing the cropped region gives the same pixels as cropping the resized image at CROPPED_ROW_START."""
+    DRIVE_ROI = (int(CROPPED_ROW_START/COMPRESSION_RATIO), -1, -1, -1)
+    """True to downscale the region of interest (area averaged) before filtering it, with 1/16 of the pixels to filter.
+    The images differ from the ones the drive cnns were trained on: see validate_drive_preprocessing.py before enabling."""
+    DOWNSCALE_FIRST = False
     def __init__(self) -> None:
         """Creates a DataScraper object, repsonsible for scraping data from the simulation.
         """        
@@ -56,8 +63,8 @@ class DataScraper:
             return
         if self.twist[0] == 0 and self.twist[1] == 0:
             return
-        cv_image = self.bridge.imgmsg_to_cv2(data, desired_encoding='passthrough')
-        hsv = DataScraper.process_img(cv_image, type='rgb')
+        cv_image, type = imgmsg_to_array(data)
+        hsv = DataScraper.process_img(cv_image, type=type)
         cv2.imshow('filtered', hsv)
         cv2.waitKey(1)
         x,z = DataScraper.discretize_vals(self.twist[0], self.twist[1], DataScraper.ERR_X, DataScraper.ERR_Z, DataScraper.SET_X, DataScraper.SET_Z)
@@ -77,29 +84,56 @@ class DataScraper:
         self.twist = (data.linear.x, data.angular.z, data.linear.z)
 
     @staticmethod
-    def process_img(img, type='bgr'):
+    def process_img(img, type='bgr', ctx=None, downscale_first=None):
         """Processes the raw image data to a format compatible for the cnn.
 
         Args:
             img (cv::Mat): raw image to be processed.
+            type (str): (Optional) the channel type of the image data. Assumed to be "bgr"
+            ctx (FrameContext, optional): context of the same image, to reuse its hsv conversion. Defaults to None.
+            downscale_first (bool, optional): True to downscale before filtering (see process_img_small). Defaults to DOWNSCALE_FIRST.
         """
-        hsv = ImageProcessor.filter(img, ImageProcessor.white_low, ImageProcessor.white_up, type)
+        if downscale_first is None:
+            downscale_first = DataScraper.DOWNSCALE_FIRST
+        if downscale_first:
+            return DataScraper.process_img_small(img, type)
+        if ctx is not None:
+            hsv = ctx.filter(ImageProcessor.white_low, ImageProcessor.white_up, roi=DataScraper.DRIVE_ROI)
+        else:
+            crped = ImageProcessor.crop(img, *DataScraper.DRIVE_ROI)
+            hsv = ImageProcessor.filter(crped, ImageProcessor.white_low, ImageProcessor.white_up, type)
         hsv = DataScraper.compress(hsv, DataScraper.COMPRESSION_RATIO)
-        hsv = ImageProcessor.crop(hsv, row_start=DataScraper.CROPPED_ROW_START)
         return hsv
 
     @staticmethod
-    def compress(img, cmp_ratio):
+    def process_img_small(img, type='bgr'):
+        """Same as process_img, but crops and downscales the raw image (averaging the pixels of each area) 
+        before filtering it at the reduced resolution.
+
+        Args:
+            img (cv::Mat): raw image to be processed.
+            type (str): (Optional) the channel type of the image data. Assumed to be "bgr"
+
+        Returns:
+            cv::Mat: the processed image, of the same size as the one of process_img
+        """
+        crped = ImageProcessor.crop(img, *DataScraper.DRIVE_ROI)
+        small = DataScraper.compress(crped, DataScraper.COMPRESSION_RATIO, interpolation=cv2.INTER_AREA)
+        return ImageProcessor.filter(small, ImageProcessor.white_low, ImageProcessor.white_up, type)
+
+    @staticmethod
+    def compress(img, cmp_ratio, interpolation=cv2.INTER_LINEAR):
         """Resizes the image using a compression ratio
 
         Args:
             img (cv::Mat): image to be compressed
             cmp_ratio (float): ratio to compress the image (< 1).
+            interpolation (int, optional): cv2 interpolation. Defaults to cv2.INTER_LINEAR.
 
         Returns:
             cv::Mat: compressed image
         """        
-        return cv2.resize(img, (0,0), fx=cmp_ratio, fy=cmp_ratio)
+        return cv2.resize(img, (0,0), fx=cmp_ratio, fy=cmp_ratio, interpolation=interpolation)
     
 
     @staticmethod
@@ -0,0 +1,110 @@
+import threading
+import time
+
+"""Startup timings, (label, secs) in the order they were recorded"""
+TIMES = []
+TIMES_LOCK = threading.Lock()
+
+
+def record(label, secs):
+    """Records a startup timing.
+
+    Args:
+        label (str): what was timed
+        secs (float): duration in seconds
+    """
+    with TIMES_LOCK:
+        TIMES.append((label, secs))
+
+
+class timed:
+    """Context manager recording the duration of its block as a startup timing.
+    """
+
+    def __init__(self, label):
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.label, time.perf_counter() - self.start)
+        return False
+
+
+def print_report():
+    """Prints all the startup timings recorded so far.
+    """
+    print("------STARTUP TIMES-------")
+    with TIMES_LOCK:
+        for label, secs in TIMES:
+            print("{:<40} {:8.3f} s".format(label, secs))
+
+
+class LazyModel:
+    """This class is a handle of a model (or any object holding models) that is only loaded when first used,
+    or loaded ahead of time in the background by a ModelLoader.
+
+    Attributes of the model can be used directly on the handle (e.g. handle.predict(img)), which blocks until
+    the model is loaded.
+    """
+
+    def __init__(self, name, factory):
+        """Creates a LazyModel object. Does not load the model.
+
+        Args:
+            name (str): name of the model, for the startup report
+            factory (function): function without arguments that loads and returns the model
+        """
+        self._name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._obj = None
+
+    @property
+    def loaded(self):
+        """bool: True if the model has been loaded."""
+        return self._obj is not None
+
+    def get(self):
+        """Obtains the model, loading it if it has not been loaded yet.
+
+        Returns:
+            any: the model
+        """
+        with self._lock:
+            if self._obj is None:
+                with timed("load " + self._name):
+                    self._obj = self._factory()
+            return self._obj
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class ModelLoader(threading.Thread):
+    """This class loads a list of LazyModels one after the other in a background thread, then prints the startup report.
+    """
+
+    def __init__(self, handles, preload=None):
+        """Creates a ModelLoader object. Call start() to start loading.
+
+        Args:
+            handles (list[LazyModel]): models to load, in order
+            preload (function, optional): function without arguments ran before loading (e.g. heavy imports). Defaults to None.
+        """
+        super().__init__(name="model_loader", daemon=True)
+        self.handles = handles
+        self.preload = preload
+
+    def run(self):
+        start = time.perf_counter()
+        if self.preload is not None:
+            self.preload()
+        for handle in self.handles:
+            handle.get()
+        record("background loading (total)", time.perf_counter() - start)
+        print_report()
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+from __future__ import print_function
+
+import sys
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+from scrape_frames import DataScraper
+from driver import Driver
+from model_server import get_server
+
+"""Validation of the downscale-first drive preprocessing (DataScraper.process_img_small) against the full resolution one,
+on raw frames recorded by DataScraper (named <count>_<x>_<z>.png, with the discretized velocities driven by hand).
+
+Usage: validate_drive_preprocessing.py FRAMES_DIR [--model PATH] [--limit N] [--out results.json]
+Prints the accuracy of the drive model with both preprocessings, how often they agree, and their latencies.
+"""
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+"""(sign of x, sign of z) -> index of the prediction (see Driver.ONE_HOT)"""
+LABELS = {
+    (1, 0): 0,
+    (0, -1): 1,
+    (0, 1): 2,
+    (1, -1): 3,
+    (1, 1): 4
+}
+
+
+def label(filename):
+    """Label of a recorded frame.
+
+    Args:
+        filename (str): name of the frame, <count>_<x>_<z>.png
+
+    Returns:
+        int: index of the prediction (see Driver.ONE_HOT), None if the name has no label
+    """
+    parts = os.path.splitext(filename)[0].split('_')
+    try:
+        x, z = float(parts[-2]), float(parts[-1])
+    except (IndexError, ValueError):
+        return None
+    return LABELS.get((int(np.sign(x)), int(np.sign(z))))
+
+
+def validate(mod, folder, limit=None):
+    """Runs the drive model on the recorded frames of a folder, with both preprocessings.
+
+    Args:
+        mod (Model): the drive model
+        folder (str): folder of the recorded raw frames
+        limit (int, optional): max number of frames. Defaults to None (all).
+
+    Returns:
+        dict: number of frames, accuracies, agreement and mean latencies (ms) of both preprocessings
+    """
+    filenames = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTS) and label(f) is not None)[:limit]
+    labels = []
+    preds = {False: [], True: []}
+    process_ms = {False: [], True: []}
+    for filename in filenames:
+        img = cv2.imread(os.path.join(folder, filename))
+        labels.append(label(filename))
+        for downscale_first in (False, True):
+            start = time.perf_counter()
+            processed = DataScraper.process_img(img, downscale_first=downscale_first)
+            process_ms[downscale_first].append(1000.0*(time.perf_counter() - start))
+            preds[downscale_first].append(int(np.argmax(mod.predict(processed))))
+    labels = np.array(labels)
+    full, small = np.array(preds[False]), np.array(preds[True])
+    return {
+        "frames": len(labels),
+        "accuracy_full": float(np.mean(full == labels)) if len(labels) else 0,
+        "accuracy_downscale_first": float(np.mean(small == labels)) if len(labels) else 0,
+        "agreement": float(np.mean(full == small)) if len(labels) else 0,
+        "process_ms_full": float(np.mean(process_ms[False])) if len(labels) else 0,
+        "process_ms_downscale_first": float(np.mean(process_ms[True])) if len(labels) else 0
+    }
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Compares the drive model accuracy of both drive preprocessings")
+    parser.add_argument("frames", help="folder of raw frames recorded by DataScraper")
+    parser.add_argument("--model", default=Driver.MODEL_PATH, help="path of the drive model")
+    parser.add_argument("--limit", type=int, default=None, help="max number of frames")
+    parser.add_argument("--out", default=None, help="json file to write the results to")
+    opts = parser.parse_args(args[1:])
+
+    res = validate(get_server().model(opts.model), opts.frames, opts.limit)
+    print("frames: {}".format(res["frames"]))
+    print("accuracy: full {:.3f}, downscale first {:.3f} ({:+.3f})".format(
+        res["accuracy_full"], res["accuracy_downscale_first"], res["accuracy_downscale_first"] - res["accuracy_full"]))
+    print("agreement: {:.3f}".format(res["agreement"]))
+    print("process_img (ms): full {:.3f}, downscale first {:.3f}".format(res["process_ms_full"], res["process_ms_downscale_first"]))
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(res, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv)